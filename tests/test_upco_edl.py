@@ -0,0 +1,52 @@
+import pathlib, tempfile, unittest
+from upco_tools import upco_edl, upco_timecode
+
+def write_edl(path_edl, edits, framerate):
+	"""Write a cuts-only EDL of (reel name, source in, source out) edits laid end to end from 01:00:00:00"""
+
+	tc_rec = upco_timecode.Timecode("01:00:00:00", framerate)
+	with open(path_edl, "w", encoding="utf-8") as file_edl:
+		file_edl.write("TITLE: test\nFCM: NON-DROP FRAME\n\n")
+		for event_number, (reel, src_in, src_out) in enumerate(edits, 1):
+			tc_in, tc_out = upco_timecode.Timecode(src_in, framerate), upco_timecode.Timecode(src_out, framerate)
+			tc_rec_out = tc_rec + (tc_out - tc_in)
+			file_edl.write(f"{str(event_number).zfill(6)}  {reel:32} V     C        {tc_in} {tc_out} {tc_rec} {tc_rec_out}\n")
+			tc_rec = tc_rec_out
+
+class TestEdlDiff(unittest.TestCase):
+
+	def setUp(self):
+		self.dir_temp = tempfile.TemporaryDirectory()
+		self.addCleanup(self.dir_temp.cleanup)
+
+	def diff(self, edits_old, edits_new, framerate):
+		path_old, path_new = pathlib.Path(self.dir_temp.name, "old.edl"), pathlib.Path(self.dir_temp.name, "new.edl")
+		write_edl(path_old, edits_old, framerate)
+		write_edl(path_new, edits_new, framerate)
+		edl_old, edl_new = upco_edl.Edl(path_old, framerate=framerate), upco_edl.Edl(path_new, framerate=framerate)
+		return [(change.get("change"), change.get("new").getSources()[0] if change.get("new") else None) for change in edl_old.diff(edl_new)]
+
+	def test_subclips_keep_framerate(self):
+		# Frame 24 only exists at 25 fps and up
+		write_edl(pathlib.Path(self.dir_temp.name, "25.edl"), [("A001C001", "01:00:01:24", "01:00:02:00")], 25)
+		subclip = upco_edl.Edl(pathlib.Path(self.dir_temp.name, "25.edl"), framerate=25).getSubclips()[0]
+		self.assertEqual((str(subclip.tc_start), str(subclip.tc_end), subclip.tc_duration.getFramecount()), ("01:00:01:24", "01:00:02:00", 1))
+
+	def test_diff_25fps(self):
+		edits = [("A001C001", "01:00:01:24", "01:00:02:00"), ("B001C001", "02:00:00:20", "02:00:01:24")]
+		self.assertEqual(self.diff(edits, edits, 25), [])
+
+	def assertMovedAndTrimmed(self, framerate, tc_late):
+		# B is trimmed at the head and A moves to the end; C and D keep their order
+		edits_old = [("A001C001", "01:00:01:00", f"01:00:02:{tc_late}"), ("B001C001", "02:00:00:00", f"02:00:01:{tc_late}"), ("C001C001", f"03:00:00:{tc_late}", "03:00:02:00"), ("D001C001", "04:00:00:00", "04:00:01:00")]
+		edits_new = [("B001C001", f"02:00:00:{tc_late}", f"02:00:01:{tc_late}"), edits_old[2], edits_old[3], edits_old[0]]
+		self.assertEqual(self.diff(edits_old, edits_new, framerate), [(upco_edl.Edl.ChangeType.TRIMMED, "B001C001"), (upco_edl.Edl.ChangeType.MOVED, "A001C001")])
+
+	def test_diff_moved_trimmed_25fps(self):
+		self.assertMovedAndTrimmed(25, "24")
+
+	def test_diff_moved_trimmed_2997fps(self):
+		self.assertMovedAndTrimmed(30000/1001, "29")
+
+if __name__ == "__main__":
+	unittest.main()
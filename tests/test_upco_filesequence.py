@@ -0,0 +1,24 @@
+import unittest
+from upco_tools import upco_filesequence
+
+class TestFileSequenceSlicing(unittest.TestCase):
+
+	def setUp(self):
+		self.seq = upco_filesequence.FileSequence("/media", "shot.", 1, 4, ".dpx")
+		for index in range(2, 11):
+			self.seq.addFrame(index)
+
+	def test_forward_step(self):
+		self.assertEqual([path.name for path in self.seq[::3]], ["shot.0001.dpx", "shot.0004.dpx", "shot.0007.dpx", "shot.0010.dpx"])
+
+	def test_negative_step_raises(self):
+		with self.assertRaises(ValueError):
+			self.seq[::-1]
+		with self.assertRaises(ValueError):
+			self.seq[8:2:-2]
+
+	def test_reversed(self):
+		self.assertEqual([path.name for path in reversed(self.seq)][:2], ["shot.0010.dpx", "shot.0009.dpx"])
+
+if __name__ == "__main__":
+	unittest.main()
@@ -6,5 +6,6 @@ __all__ = [
 	"upco_ltfs",
 	"upco_metadata",
 	"upco_shot",
-	"upco_deepworm"
+	"upco_deepworm",
+	"upco_ingest"
 ]
@@ -1,8 +1,12 @@
-import pathlib, re
+import pathlib, re, enum, bisect, collections
 from . import upco_timecode, upco_shot
 
 
 class Edl:
+
+	class ChangeType(enum.Enum):
+		"""Kinds of changes reported by Edl.diff()"""
+		UNCHANGED, ADDED, REMOVED, TRIMMED, MOVED = ("Unchanged", "Added", "Removed", "Trimmed", "Moved")
 	
 	class _Event:
 		
@@ -10,8 +14,9 @@ class Edl:
 		pattern_cut    = re.compile(r"^(?P<event_number>\d+)\s+(?P<reel_name>[^\s]+)\s+(?P<track_type>A[%\s]*|B|V)\s+(?P<event_type>C|D|W\d+|K\s*[BO]?)\s+(?P<event_duration>\d*)\s+(?P<tc_src_in>\d{2}:\d{2}:\d{2}:\d{2})\s+(?P<tc_src_out>\d{2}:\d{2}:\d{2}:\d{2})\s+(?P<tc_rec_in>\d{2}:\d{2}:\d{2}:\d{2})\s+(?P<tc_rec_out>\d{2}:\d{2}:\d{2}:\d{2})\s*$", re.I)
 		pattern_motion = re.compile(r"^(?P<speed_type>M\d+)\s+(?P<reel_name>[^\s]+)\s+(?P<frame_rate>[+-]?(\d+)?\.?\d+)\s+(?P<tc_start>\d{2}:\d{2}:\d{2}:\d{2})")
 
-		def __init__(self, event):
+		def __init__(self, event, framerate=23.976):
 
+			self.framerate = framerate
 			self.edits = []
 			self.motion = []
 			self.comments = []
@@ -31,10 +36,26 @@ class Edl:
 			self.addEdit(event)
 
 		def addEdit(self, edit):
-			self.edits.append({"source":edit.group("reel_name"), "track": edit.group("track_type"), "event_type": edit.group("event_type"), "event_duration": edit.group("event_duration"), "src_tc_in": upco_timecode.Timecode(edit.group("tc_src_in")), "src_tc_out":upco_timecode.Timecode(edit.group("tc_src_out")), "rec_tc_in":upco_timecode.Timecode(edit.group("tc_rec_in")), "rec_tc_out":upco_timecode.Timecode(edit.group("tc_rec_out"))})
+			self.edits.append({"source":edit.group("reel_name"), "track": edit.group("track_type"), "event_type": edit.group("event_type"), "event_duration": edit.group("event_duration"), "src_tc_in": upco_timecode.Timecode(edit.group("tc_src_in"), self.framerate), "src_tc_out":upco_timecode.Timecode(edit.group("tc_src_out"), self.framerate), "rec_tc_in":upco_timecode.Timecode(edit.group("tc_rec_in"), self.framerate), "rec_tc_out":upco_timecode.Timecode(edit.group("tc_rec_out"), self.framerate)})
 
 		def addMotionEffect(self, effect):
-			self.motion.append({"type": effect.group("speed_type"), "source": effect.group("reel_name"), "frame_rate": float(effect.group("frame_rate")), "tc_start": upco_timecode.Timecode(effect.group("tc_start"))})
+			self.motion.append({"type": effect.group("speed_type"), "source": effect.group("reel_name"), "frame_rate": float(effect.group("frame_rate")), "tc_start": upco_timecode.Timecode(effect.group("tc_start"), self.framerate)})
+
+		@classmethod
+		def fromShot(cls, shot, event_number, tc_rec_in, track="V"):
+			"""Build a cut event from an upco_shot.Shot, laid down on the record side at tc_rec_in"""
+
+			event = cls.__new__(cls)
+			event.framerate = shot.framerate
+			event.event_number = int(event_number)
+			event.edits = [{"source": shot.shot, "track": track, "event_type": "C", "event_duration": "", "src_tc_in": shot.tc_start, "src_tc_out": shot.tc_end, "rec_tc_in": tc_rec_in, "rec_tc_out": tc_rec_in + shot.tc_duration}]
+			event.motion = []
+			event.comments = []
+
+			if shot.metadata.get("Name"):
+				event.addComment(f"* FROM CLIP NAME:  {shot.metadata.get('Name')}")
+
+			return event
 
 		def addComment(self, comment):
 			self.comments.append(comment)
@@ -70,7 +91,7 @@ class Edl:
 				metadata = {"Name":edit.get("clip_name")} if edit.get("clip_name") else {}
 
 				
-				subclips.append(upco_shot.Shot(shot=edit.get("source"), tc_start=edit.get("src_tc_in"), tc_end=tc_out, metadata=metadata))
+				subclips.append(upco_shot.Shot(shot=edit.get("source"), tc_start=edit.get("src_tc_in"), tc_end=tc_out, frm_rate=self.framerate, metadata=metadata))
 			
 			return subclips
 			#return [{"shot":x.get("source"), "tc_in": x.get("src_tc_in"), "tc_out":x.get("src_tc_out"), "clip_name":x.get("clip_name",x.get("source"))} for x in self.edits]
@@ -82,7 +103,7 @@ class Edl:
 			return max(x.get("rec_tc_out") for x in self.edits)
 
 		def getDuration(self):
-			tc = upco_timecode.Timecode()
+			tc = upco_timecode.Timecode(0, self.framerate)
 			for edit in self.edits:
 				tc += (edit.get("src_tc_out") - edit.get("src_tc_in"))
 			return tc
@@ -91,29 +112,21 @@ class Edl:
 		def __eq__(self, cmp):
 			return cmp == self.event_number
 
-		def __str__(self):
-			final = []
+		def formatLines(self, padding=6):
+			"""Yield the formatted lines of this event, one at a time"""
+
+			event_number = str(self.event_number).zfill(padding)
+
 			for edit in self.edits:
-				line =  f"{str(self.event_number).zfill(6)}  "
-				line += f"{edit.get('source','').ljust(32)} "
-				line += f"{edit.get('track_type','V').ljust(6)} "
-				line += f"{edit.get('event_type','').ljust(6)} "
-				line += f"{edit.get('event_duration','').ljust(3)} "
-				line += f"{edit.get('src_tc_in')} {edit.get('src_tc_out')} "
-				line += f"{edit.get('rec_tc_in')} {edit.get('rec_tc_out')} "
-				final.append(line)
-			
+				yield "%s  %-32s %-6s %-6s %-3s %s %s %s %s" % (event_number, edit.get("source",""), edit.get("track","V"), edit.get("event_type",""), edit.get("event_duration",""), edit.get("src_tc_in"), edit.get("src_tc_out"), edit.get("rec_tc_in"), edit.get("rec_tc_out"))
+
 			for m in self.motion:
-				line =  f"{m.get('type').ljust(7)} "
-				line += f"{m.get('source').ljust(42)} "
-				line += f"{m.get('frame_rate')} "
-				line += f"{m.get('tc_start')} "
-				final.append(line)
-			
-			for comment in self.comments:
-				final.append(f"{comment}")
-			
-			return '\n'.join(final)
+				yield "%-7s %-42s %s %s" % (m.get("type"), m.get("source"), m.get("frame_rate"), m.get("tc_start"))
+
+			yield from self.comments
+
+		def __str__(self):
+			return '\n'.join(self.formatLines())
 
 	# Load EDL from file if specified
 	def _parseFromFile(self, path_edl):
@@ -129,8 +142,15 @@ class Edl:
 				line = line.rstrip('\n')
 
 				try:
+					# Header lines
+					if last_event is None and line.upper().startswith("TITLE:"):
+						self.edl_title = line.split(':',1)[1].strip()
+					
+					elif last_event is None and line.upper().startswith("FCM:"):
+						self.edl_fcm = line.split(':',1)[1].strip()
+
 					# Line describes a standard edit
-					if self.__class__._Event.pattern_cut.match(line):
+					elif self.__class__._Event.pattern_cut.match(line):
 						last_event = self.addEvent(self.__class__._Event.pattern_cut.match(line))
 
 					# Line describes a motion effect
@@ -150,13 +170,15 @@ class Edl:
 		if not len(self.events):
 			raise RuntimeError(f"{path_edl.name} does not appear to be a valid EDL file.")
 
-	def __init__(self, path_edl=None):
+	def __init__(self, path_edl=None, framerate=23.976):
 
+		self.framerate = framerate
 		self.event_number_padding = 6
-		self.tc_duration = upco_timecode.Timecode()
+		self.tc_duration = upco_timecode.Timecode(0, self.framerate)
 		self.edl_title = "Untitled EDL"
 		self.edl_fcm = "NON-DROP FRAME"
 		self.events = []
+		self._event_lookup = {}
 		self.path_edl = None
 
 		if path_edl is not None:
@@ -166,15 +188,20 @@ class Edl:
 
 		event_index = int(event.group("event_number"))
 
+		# Look events up by number; the lookup is rebuilt if the list was changed outside of addEvent
+		if len(self._event_lookup) != len(self.events):
+			self._event_lookup = {x.event_number: x for x in self.events}
+
 		# If this is part of an existing event, check it in
-		if event_index in self.events:
-			self.events[self.events.index(event_index)].addEdit(event)
+		if event_index in self._event_lookup:
+			self._event_lookup[event_index].addEdit(event)
 		
 		# Otherwise add it as a new event
 		else:
-			self.events.append(self.__class__._Event(event))
+			self.events.append(self.__class__._Event(event, self.framerate))
+			self._event_lookup[event_index] = self.events[-1]
 		
-		return self.events[self.events.index(event_index)] if event_index in self.events else None
+		return self._event_lookup.get(event_index)
 	
 	def getSources(self):
 		sources = []
@@ -194,6 +221,170 @@ class Edl:
 	def getEndTC(self):
 		return max(x.getEndTC() for x in self.events)
 	
+	@staticmethod
+	def _getEventKey(event):
+		"""Build a hashable comparison key for an event from its subclips: ((source, src_tc_in, src_tc_out), ...)"""
+		return tuple((clip.shot, clip.tc_start.framecount, clip.tc_end.framecount) for clip in event.getSubclips())
+
+	@staticmethod
+	def _alignKeys(keys_old, keys_new):
+		"""
+		Align two lists of event keys, patience-diff style.
+
+		Keys that occur exactly once in each list are used as anchors, and the longest common subsequence
+		of those anchors is found with patience sorting (O(n log n)).  Matches are then grown outward from
+		each anchor to pick up repeated keys that sit in the same position in both cuts.
+
+		Returns:
+			dict -- Mapping of old index to new index for events that are unchanged
+		"""
+
+		count_old = collections.Counter(keys_old)
+		count_new = collections.Counter(keys_new)
+		index_new = {key: idx for idx, key in enumerate(keys_new) if count_new[key] == 1}
+
+		# Candidate anchors, ordered by position in the old cut
+		candidates = [(idx_old, index_new[key]) for idx_old, key in enumerate(keys_old) if count_old[key] == 1 and key in index_new]
+
+		# Longest increasing run of new indices, via patience sorting
+		pile_tops = []
+		pile_ids  = []
+		backlinks = []
+		for pos, (idx_old, idx_new) in enumerate(candidates):
+			pile = bisect.bisect_left(pile_tops, idx_new)
+			if pile == len(pile_tops):
+				pile_tops.append(idx_new)
+				pile_ids.append(pos)
+			else:
+				pile_tops[pile] = idx_new
+				pile_ids[pile] = pos
+			backlinks.append(pile_ids[pile-1] if pile else None)
+
+		anchors = []
+		pos = pile_ids[-1] if pile_ids else None
+		while pos is not None:
+			anchors.append(candidates[pos])
+			pos = backlinks[pos]
+		anchors.reverse()
+
+		matched = dict(anchors)
+		matched_new = set(matched.values())
+
+		# Grow each anchor forward and backward across identical neighbours
+		for idx_old, idx_new in anchors:
+			for step in (1, -1):
+				o, n = idx_old + step, idx_new + step
+				while 0 <= o < len(keys_old) and 0 <= n < len(keys_new) and o not in matched and n not in matched_new and keys_old[o] == keys_new[n]:
+					matched[o] = n
+					matched_new.add(n)
+					o, n = o + step, n + step
+
+		# If nothing was unique, fall back to matching from the head of both cuts
+		if not anchors:
+			idx = 0
+			while idx < min(len(keys_old), len(keys_new)) and keys_old[idx] == keys_new[idx]:
+				matched[idx] = idx
+				idx += 1
+
+		return matched
+
+	def diff(self, other, include_unchanged=False):
+		"""
+		Build a change list between this EDL (the old cut) and another EDL (the new cut).
+
+		Events are compared by source and source timecode range, as returned by _Event.getSubclips().
+		Events found in the same relative order in both cuts are unchanged; events with identical sources
+		found elsewhere are moved; events sharing a source with an overlapping source range are trimmed.
+		Anything left over is added or removed.
+
+		Arguments:
+			other {Edl} -- The newer EDL to compare against
+
+		Keyword Arguments:
+			include_unchanged {bool} -- Include unchanged events in the change list (default: {False})
+
+		Raises:
+			TypeError: other is not an Edl
+
+		Returns:
+			list -- Dicts of {"change": Edl.ChangeType, "old": _Event|None, "new": _Event|None}, in new cut order
+		"""
+
+		if not isinstance(other, Edl):
+			raise TypeError(f"Can only compare against another Edl (got {type(other)})")
+
+		keys_old = [self._getEventKey(event) for event in self.events]
+		keys_new = [self._getEventKey(event) for event in other.events]
+
+		pairs = {idx_old: (self.ChangeType.UNCHANGED, idx_new) for idx_old, idx_new in self._alignKeys(keys_old, keys_new).items()}
+		paired_new = {idx_new for _, idx_new in pairs.values()}
+
+		# Same source ranges found out of order: moved
+		unmatched_new = collections.defaultdict(collections.deque)
+		for idx_new, key in enumerate(keys_new):
+			if idx_new not in paired_new:
+				unmatched_new[key].append(idx_new)
+
+		for idx_old, key in enumerate(keys_old):
+			if idx_old not in pairs and unmatched_new.get(key):
+				idx_new = unmatched_new[key].popleft()
+				pairs[idx_old] = (self.ChangeType.MOVED, idx_new)
+				paired_new.add(idx_new)
+
+		# Shared source with overlapping source range: trimmed
+		# Unmatched old ranges are kept sorted by tc_in per source; anything overlapping [tc_in, tc_out) starts
+		# somewhere between tc_in minus the longest range for that source and tc_out
+		unmatched_old = collections.defaultdict(list)
+		longest = collections.defaultdict(int)
+		for idx_old, key in enumerate(keys_old):
+			if idx_old not in pairs:
+				for source, start, end in key:
+					unmatched_old[source].append((start, end, idx_old))
+					longest[source] = max(longest[source], end - start)
+		for ranges in unmatched_old.values():
+			ranges.sort()
+
+		for idx_new, key in enumerate(keys_new):
+			if idx_new in paired_new:
+				continue
+			for source, tc_in, tc_out in key:
+				ranges = unmatched_old.get(source)
+				if not ranges:
+					continue
+				window = ranges[bisect.bisect_left(ranges, (tc_in - longest[source],)):bisect.bisect_left(ranges, (tc_out,))]
+				idx_old = min((idx for start, end, idx in window if tc_in < end), default=None)
+				if idx_old is None:
+					continue
+
+				pairs[idx_old] = (self.ChangeType.TRIMMED, idx_new)
+				paired_new.add(idx_new)
+
+				# Matched old events are taken out of the running entirely
+				for src, start, end in keys_old[idx_old]:
+					ranges_src = unmatched_old[src]
+					pos = bisect.bisect_left(ranges_src, (start, end, idx_old))
+					if pos < len(ranges_src) and ranges_src[pos] == (start, end, idx_old):
+						del ranges_src[pos]
+				break
+
+		# Build change list in new cut order, slotting removals in after the last paired event that preceded them
+		changes = []
+		last_new = -1
+		for idx_old, event in enumerate(self.events):
+			if idx_old in pairs:
+				change, idx_new = pairs[idx_old]
+				last_new = max(last_new, idx_new)
+				if change != self.ChangeType.UNCHANGED or include_unchanged:
+					changes.append(((idx_new, 0), {"change": change, "old": event, "new": other.events[idx_new]}))
+			else:
+				changes.append(((last_new, 1), {"change": self.ChangeType.REMOVED, "old": event, "new": None}))
+
+		for idx_new, event in enumerate(other.events):
+			if idx_new not in paired_new:
+				changes.append(((idx_new, 0), {"change": self.ChangeType.ADDED, "old": None, "new": event}))
+
+		return [change for _, change in sorted(changes, key=lambda x: x[0])]
+
 	def printEdl(self):
 		#tc = upco_timecode.Timecode("01:00:00:00")
 
@@ -206,19 +397,60 @@ class Edl:
 			#tc += event.getDuration()
 
 
-	def writeEdl(self, path_output=None):
+	def _iterEvents(self, events, tc_record_start):
+		"""Normalize an iterable of _Events and/or upco_shot.Shots into _Events, laying Shots end-to-end from tc_record_start"""
+
+		tc_rec = upco_timecode.Timecode(tc_record_start, self.framerate)
+		tc_rate = tc_rec.getFramerate()
+		
+		for event_number, event in enumerate(events, start=1):
+
+			if isinstance(event, upco_shot.Shot):
+				if event.tc_start.getFramerate() != tc_rate:
+					raise ValueError(f"Cannot write a {event.framerate} fps shot to a {self.framerate} fps EDL")
+				
+				# Re-base the record timecode onto the shot's framerate so the math lines up
+				event = self.__class__._Event.fromShot(event, event_number, upco_timecode.Timecode(tc_rec.getFramecount(), event.framerate))
+			
+			elif not isinstance(event, self.__class__._Event):
+				raise ValueError(f"Events must be of type Edl._Event or upco_shot.Shot (got {type(event)})")
+
+			elif event.edits and event.edits[0].get("src_tc_in").getFramerate() != tc_rate:
+				raise ValueError(f"Cannot write a {event.framerate} fps event to a {self.framerate} fps EDL")
+
+			tc_rec = upco_timecode.Timecode(max(edit.get("rec_tc_out").getFramecount() for edit in event.edits), self.framerate) if event.edits else tc_rec
+			yield event
+
+	def writeEdl(self, path_output=None, events=None, tc_record_start="01:00:00:00", buffer_size=1024*1024):
+		"""
+		Stream the EDL to disk, one event at a time.
+
+		Keyword Arguments:
+			path_output {str|pathlib.Path} -- Path of file to output (default: {out.edl})
+			events {iter} -- Events or upco_shot.Shots (such as a Shotlist) to write instead of this EDL's events (default: {None})
+			tc_record_start {str|Timecode} -- Record timecode of the first Shot, when writing Shots (default: {"01:00:00:00"})
+			buffer_size {int} -- Size in bytes of the output buffer (default: {1MB})
+
+		Raises:
+			ValueError: Events are not _Events or Shots, or don't match the EDL's framerate
+
+		Returns:
+			pathlib.Path -- Path of the written file
+		"""
 
 		if not path_output:
 			path_output = pathlib.Path("out.edl")
 		else:
 			path_output = pathlib.Path(path_output)
 
-		with path_output.open('w', encoding="utf-8") as edl_output:
+		with path_output.open('w', encoding="utf-8", buffering=buffer_size) as edl_output:
 
 			edl_output.write(f"TITLE: {self.edl_title}\n")
 			edl_output.write(f"FCM: {self.edl_fcm}\n")
 
-			edl_output.write("\n\n".join(str(event) for event in self.events))
+			for event in self._iterEvents(self.events if events is None else events, tc_record_start):
+				edl_output.write("\n")
+				edl_output.writelines(line + "\n" for line in event.formatLines(self.event_number_padding))
 		
 		return path_output
 
@@ -2,78 +2,507 @@
 # Library for grouping files by sequence (ie shot.[008600-008643].dpx)
 # By Michael Jordan <michael.jordan@nbcuni.com>
 
-import pathlib, re
-#import upco_timecode
+import pathlib, re, os, math, bisect, concurrent.futures
+from . import upco_timecode
 
 class Sequencer:
 
 	pattern_sequence = re.compile(r"^(?P<basename>.*?)(?P<index>\d+)$")
 
-	def __init__(self, pathlist):
+	def __init__(self, pathlist=None):
 
 		self.sequences = []
+		self._groups = {}	# (parent, basename, padding, ext) -> FileSequence
 
-		for path in sorted(pathlib.Path(path) for path in pathlist):
-			self._addSequence(path)
+		for path in pathlist or []:
+			self._addSequence(pathlib.Path(path))
+		
+		self.sequences.sort(key=lambda seq: (seq.parent, seq.basename, seq.ext, seq.padding))
+
+	@classmethod
+	def fromDirectory(cls, path, recursive=True, max_workers=None):
+		"""Build a Sequencer by scanning a directory on disk.  See scanDirectory()."""
+
+		sequencer = cls()
+		for _ in sequencer.scanDirectory(path, recursive=recursive, max_workers=max_workers):
+			pass
+		return sequencer
+
+	@staticmethod
+	def _scanDirectory(path):
+		"""List a single directory, returning its path, (stem, ext) pairs of its files, and its subdirectories"""
+
+		files = []
+		subdirs = []
+
+		with os.scandir(path) as entries:
+			for entry in entries:
+				if entry.is_dir(follow_symlinks=False):
+					subdirs.append(entry.path)
+				elif entry.is_file():
+					files.append(os.path.splitext(entry.name))
+		
+		return path, files, subdirs
+
+	def scanDirectory(self, path, recursive=True, max_workers=None):
+		"""
+		Scan a directory with os.scandir, grouping files into sequences one directory at a time.
+
+		Frames are grouped from their names as strings, so no pathlib.Path is built per frame.
+		Sequences are added to this Sequencer and yielded as each directory is finished.
+
+		Arguments:
+			path {str|pathlib.Path} -- Directory to scan
+
+		Keyword Arguments:
+			recursive {bool} -- Also scan subdirectories (default: {True})
+			max_workers {int} -- List subdirectories concurrently in a pool of this many threads; useful for network storage (default: {None})
+
+		Yields:
+			FileSequence -- Each sequence as its directory is grouped
+		"""
+
+		path = pathlib.Path(path)
+		if not path.is_dir():
+			raise NotADirectoryError(f"{path} is not a directory")
+
+		# Single-threaded: walk depth-first
+		if not max_workers:
+			pending = [str(path)]
+			while pending:
+				dirpath, files, subdirs = self._scanDirectory(pending.pop())
+				yield from self._addDirectory(dirpath, files)
+				if recursive:
+					pending.extend(sorted(subdirs, reverse=True))
+			return
+
+		# Threaded: list directories in the pool as they're discovered, group them here as they come back
+		with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+			pending = {pool.submit(self._scanDirectory, str(path))}
+			while pending:
+				done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+				for future in done:
+					dirpath, files, subdirs = future.result()
+					if recursive:
+						pending.update(pool.submit(self._scanDirectory, subdir) for subdir in subdirs)
+					yield from self._addDirectory(dirpath, files)
+
+	def _addDirectory(self, dirpath, files):
+		"""Group (stem, ext) pairs found in a single directory and return the new sequences"""
+
+		parent = pathlib.Path(dirpath)
+		start = len(self.sequences)
+
+		for stem, ext in files:
+			self._addFile(parent, stem, ext)
+		
+		return sorted(self.sequences[start:], key=lambda seq: (seq.basename, seq.ext, seq.padding))
 
 	def _addSequence(self, path):
+		self._addFile(path.parent, path.stem, path.suffix)
+
+	def _addFile(self, parent, stem, ext):
 
-		match = self.__class__.pattern_sequence.match(path.stem)
+		match = self.__class__.pattern_sequence.match(stem)
 
+		# Non-sequenced files are grouped as a single with no padding
+		# TODO: Catalog non-sequenced files
 		if not match:
-			# TODO: Catalog non-sequenced files
-			self.sequences.append(FileSequence(path.parent, path.stem, 0, 0, path.suffix))
+			key = (parent, stem, 0, ext)
+			if key not in self._groups:
+				self._groups[key] = FileSequence(parent, stem, 0, 0, ext)
+				self.sequences.append(self._groups[key])
+			return
 		
+		basename = match.group("basename")
+		index    = int(match.group("index"))
+		padding  = len(match.group("index"))
+		key      = (parent, basename, padding, ext)
+
+		# Add the frame to its sequence regardless of order; gaps are kept in the sequence's frame set
+		seq = self._groups.get(key)
+		if seq is not None:
+			seq.addFrame(index)
 		else:
-			parent   = path.parent
-			basename = match.group("basename")
-			index    = int(match.group("index"))
-			padding  = len(match.group("index"))
-			ext      = path.suffix
+			self._groups[key] = FileSequence(parent, basename, index, padding, ext)
+			self.sequences.append(self._groups[key])
+
+	def list(self, expanded=False):
+		return [seq.expand() if expanded else seq.group() for seq in self.sequences]
+
+	@staticmethod
+	def _surveyFrames(seq, frames):
+		"""Stat a chunk of frames from a sequence, returning total size and the frames that were missing or zero-byte"""
+
+		size    = 0
+		missing = []
+		empty   = []
+
+		for idx in frames:
+			try:
+				filesize = os.stat(seq.framePathString(idx)).st_size
+			except OSError:
+				missing.append(idx)
+				continue
+			if not filesize:
+				empty.append(idx)
+			size += filesize
+		
+		return size, missing, empty, len(frames)
+
+	def survey(self, max_workers=16, chunk_size=512, progress=None):
+		"""
+		Stat every frame of every sequence concurrently, and report per-sequence totals and anomalies.
 
-			# Compare to previous sequence, if there is one
-			seq = self.sequences[-1] if len(self.sequences) else None
-			if seq and seq.parent == parent and seq.basename == basename and seq.max+1 == index and seq.padding == padding and seq.ext == ext:
-				self.sequences[-1].max += 1
+		Frames are stat'd in chunks across a bounded thread pool, with only a few chunks queued per worker at a time.
 
+		Keyword Arguments:
+			max_workers {int} -- Number of stat threads (default: {16})
+			chunk_size {int} -- Number of frames per chunk of work (default: {512})
+			progress {callable} -- Called as progress(frames_done, frames_total) after each chunk (default: {None})
+
+		Yields:
+			dict -- {"sequence", "size", "count", "gaps", "missing", "empty"} for each sequence as it is finished.
+			"gaps" are (first, last) runs absent from the listing; "missing" and "empty" are FrameRanges of
+			listed frames which could not be stat'd or were zero bytes.
+		"""
+
+		frames_total = sum(len(seq) for seq in self.sequences)
+		frames_done  = 0
+
+		results = {}
+
+		def jobs():
+			for seq in self.sequences:
+				results[id(seq)] = {"sequence": seq, "size": 0, "count": 0, "gaps": seq.getMissingFrames(), "missing": FrameRanges(), "empty": FrameRanges(), "_chunks": max(math.ceil(len(seq) / chunk_size), 1)}
+				for start in range(0, max(len(seq), 1), chunk_size):
+					yield seq, seq.frames.sliceByPosition(start, start + chunk_size)
+		
+		jobs = jobs()
+
+		with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+
+			pending = {}
+			while True:
+				
+				# Keep the queue topped up without submitting everything at once
+				for seq, frames in jobs:
+					pending[pool.submit(self._surveyFrames, seq, frames)] = seq
+					if len(pending) >= max_workers * 4:
+						break
+				
+				if not pending:
+					break
+
+				done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+				for future in done:
+					seq = pending.pop(future)
+					size, missing, empty, count = future.result()
+
+					result = results[id(seq)]
+					result["size"]  += size
+					result["count"] += count - len(missing)
+					for idx in missing: result["missing"].add(idx)
+					for idx in empty: result["empty"].add(idx)
+
+					frames_done += count
+					if progress:
+						progress(frames_done, frames_total)
+					
+					# Sequence is finished once all of its chunks are in
+					result["_chunks"] -= 1
+					if not result["_chunks"]:
+						del result["_chunks"]
+						yield results.pop(id(seq))
+
+class FrameRanges:
+	"""A set of frame indices, stored compactly as sorted runs of consecutive frames"""
+
+	def __init__(self, frames=None):
+
+		self._starts  = []		# First frame of each run
+		self._ends    = []		# Last frame of each run (inclusive)
+		self._count   = 0
+		self._offsets = None	# Cached position of the first frame of each run, for indexing
+
+		for frame in frames or []:
+			self.add(frame)
+	
+	@classmethod
+	def fromRuns(cls, runs):
+		"""Build from (first, last) runs that are already sorted and non-overlapping"""
+
+		frames = cls()
+		for start, end in runs:
+			if frames._ends and frames._ends[-1] + 1 >= start:
+				frames._ends[-1] = end
 			else:
-				self.sequences.append(FileSequence(parent, basename, index, padding, ext))
+				frames._starts.append(start)
+				frames._ends.append(end)
+		frames._count = sum(end - start + 1 for start, end in zip(frames._starts, frames._ends))
+		return frames
+	
+	def add(self, frame):
+		"""Add a frame, extending or merging runs as needed"""
 
-	def list(self, expanded=False):
-		return [seq.grouped() for seq in self.sequences]
+		frame = int(frame)
+		self._offsets = None
+
+		# Fast path for frames arriving in order
+		if self._ends and self._ends[-1] + 1 == frame:
+			self._ends[-1] = frame
+			self._count += 1
+			return
+
+		idx = bisect.bisect_right(self._starts, frame) - 1
+
+		# Already have it
+		if idx >= 0 and frame <= self._ends[idx]:
+			return
+		
+		joins_prev = idx >= 0 and self._ends[idx] + 1 == frame
+		joins_next = idx + 1 < len(self._starts) and self._starts[idx+1] - 1 == frame
+
+		if joins_prev and joins_next:
+			self._ends[idx] = self._ends[idx+1]
+			del self._starts[idx+1]
+			del self._ends[idx+1]
+		elif joins_prev:
+			self._ends[idx] = frame
+		elif joins_next:
+			self._starts[idx+1] = frame
+		else:
+			self._starts.insert(idx+1, frame)
+			self._ends.insert(idx+1, frame)
+		
+		self._count += 1
+
+	def _getOffsets(self):
+		if self._offsets is None:
+			self._offsets = []
+			position = 0
+			for start, end in zip(self._starts, self._ends):
+				self._offsets.append(position)
+				position += end - start + 1
+		return self._offsets
+
+	def frameAt(self, position):
+		"""Frame at a given position in the set, counting from the lowest frame"""
+
+		if position < 0:
+			position += self._count
+		if not 0 <= position < self._count:
+			raise IndexError(f"Frame position {position} out of range")
+		
+		offsets = self._getOffsets()
+		idx = bisect.bisect_right(offsets, position) - 1
+		return self._starts[idx] + position - offsets[idx]
+
+	def sliceByPosition(self, start, stop):
+		"""New FrameRanges holding the frames at positions start through stop-1, computed run by run"""
+
+		offsets = self._getOffsets()
+		runs = []
+		
+		for idx in range(max(bisect.bisect_right(offsets, start) - 1, 0), len(offsets)):
+			if offsets[idx] >= stop:
+				break
+			run_first = self._starts[idx] + max(start - offsets[idx], 0)
+			run_last  = min(self._ends[idx], self._starts[idx] + stop - 1 - offsets[idx])
+			if run_first <= run_last:
+				runs.append((run_first, run_last))
+		
+		return self.fromRuns(runs)
+
+	def sliceByFrame(self, first, last):
+		"""New FrameRanges holding only the frames from first through last, inclusive"""
+
+		runs = []
+		for idx in range(max(bisect.bisect_right(self._starts, first) - 1, 0), len(self._starts)):
+			if self._starts[idx] > last:
+				break
+			run_first = max(self._starts[idx], first)
+			run_last  = min(self._ends[idx], last)
+			if run_first <= run_last:
+				runs.append((run_first, run_last))
+		
+		return self.fromRuns(runs)
+
+	def ranges(self):
+		"""List of (first, last) runs of consecutive frames"""
+		return list(zip(self._starts, self._ends))
+
+	def missing(self):
+		"""List of (first, last) runs of frames missing between min and max"""
+		return [(end+1, start-1) for end, start in zip(self._ends, self._starts[1:])]
+
+	def missingCount(self):
+		return (self.max - self.min + 1 - self._count) if self._count else 0
+
+	@property
+	def min(self):
+		return self._starts[0] if self._starts else None
+
+	@property
+	def max(self):
+		return self._ends[-1] if self._ends else None
+
+	def __contains__(self, frame):
+		try:
+			frame = int(frame)
+		except (TypeError, ValueError):
+			return False
+		idx = bisect.bisect_right(self._starts, frame) - 1
+		return idx >= 0 and frame <= self._ends[idx]
+
+	def __len__(self):
+		return self._count
+
+	def __iter__(self):
+		for start, end in zip(self._starts, self._ends):
+			yield from range(start, end+1)
+	
+	def __str__(self):
+		return ','.join(str(start) if start == end else f"{start}-{end}" for start, end in self.ranges())
+
+	def __repr__(self):
+		return f"{self.__class__.__name__}({self})"
 
 class FileSequence:
 
-	def __init__(self, parent, basename, index, padding, ext):
+	def __init__(self, parent, basename, index, padding, ext, framerate=23.976, tc_offset=0):
 
 		self.parent   = pathlib.Path(parent)
 		self.basename = str(basename)
 		self.padding  = int(padding)
 		self.ext	  = str(ext)
 
-		self.min = self.max = int(index)
+		self.frames = FrameRanges([index])
+
+		# Frame index N is timecode N + tc_offset frames
+		self.framerate = float(framerate)
+		self.tc_offset = upco_timecode.Timecode(tc_offset, self.framerate).getFramecount()
+	
+	@property
+	def min(self):
+		return self.frames.min
+	
+	@property
+	def max(self):
+		return self.frames.max
+
+	def addFrame(self, index):
+		self.frames.add(index)
+	
+	def getMissingFrames(self):
+		"""List of (first, last) runs of frames missing from this sequence"""
+		return self.frames.missing()
+
+	# Timecode mapping
+	@property
+	def tc_start(self):
+		return self.getTimecode(self.min)
 	
+	@property
+	def tc_end(self):
+		"""Timecode following the last frame, to match Shot.tc_end and EDL out points"""
+		return self.getTimecode(self.max + 1)
+
+	def setTimecodeStart(self, tc_start, framerate=None):
+		"""Set the offset so the first frame of the sequence lands on a given timecode"""
+
+		if framerate is not None:
+			self.framerate = float(framerate)
+		self.tc_offset = upco_timecode.Timecode(tc_start, self.framerate).getFramecount() - self.min
+
+	def getTimecode(self, index):
+		"""Timecode of a given frame index"""
+		return upco_timecode.Timecode(int(index) + self.tc_offset, self.framerate)
+
+	def getFrameIndex(self, tc):
+		"""Frame index of a given timecode"""
+		return self.getTimecode(0).validate(tc).getFramecount() - self.tc_offset
+
+	def sliceByTimecode(self, tc_in, tc_out):
+		"""New FileSequence of the frames from tc_in up to (but not including) tc_out, like an EDL source range"""
+		return self._copyWithFrames(self.frames.sliceByFrame(self.getFrameIndex(tc_in), self.getFrameIndex(tc_out) - 1))
+
+	def _copyWithFrames(self, frames):
+		"""New FileSequence sharing this one's naming but holding a different set of frames"""
+
+		seq = self.__class__.__new__(self.__class__)
+		seq.__dict__.update(self.__dict__)
+		seq.frames = frames
+		return seq
+
+	def framePath(self, index):
+		"""Path of a given frame index, whether or not it's part of the sequence"""
+
+		if self.padding == 0:
+			return pathlib.Path(self.parent, f"{self.basename}{self.ext}")
+		return pathlib.Path(self.parent, f"{self.basename}{self._formatIndex(index)}{self.ext}")
+
+	def framePathString(self, index):
+		"""Like framePath(), but as a plain string for when building a pathlib.Path per frame is too costly"""
+
+		if self.padding == 0:
+			return os.path.join(self.parent, f"{self.basename}{self.ext}")
+		return os.path.join(self.parent, f"{self.basename}{self._formatIndex(index)}{self.ext}")
+
+	# Makin' it listy.  Nothing here builds more than one path at a time.
+	def __len__(self):
+		return len(self.frames)
+	
+	def __iter__(self):
+		for idx in self.frames:
+			yield self.framePath(idx)
+
+	def __getitem__(self, key):
+
+		# Slices return a new FileSequence, which always runs in frame order
+		if isinstance(key, slice):
+			positions = range(len(self))[key]
+			if positions.step < 0:
+				raise ValueError("FileSequence slices can't run backwards; use reversed() to walk the frames in reverse")
+			if positions.step == 1:
+				return self._copyWithFrames(self.frames.sliceByPosition(positions.start, positions.stop))
+			return self._copyWithFrames(FrameRanges(self.frames.frameAt(pos) for pos in positions))
+		
+		return self.framePath(self.frames.frameAt(key))
+
+	def __contains__(self, item):
+		"""Check for a frame index, or a path belonging to this sequence"""
+
+		if isinstance(item, int):
+			return bool(self.padding) and item in self.frames
+
+		path = pathlib.Path(item)
+		if path.parent != self.parent or path.suffix != self.ext:
+			return False
+		
+		stem = path.stem
+		if self.padding == 0:
+			return stem == self.basename
+		
+		index = stem[len(self.basename):]
+		return stem.startswith(self.basename) and len(index) == self.padding and index.isdigit() and int(index) in self.frames
+
 	def __str__(self):
 		return str(self.group())
 
+	def _formatIndex(self, index):
+		return str(index).zfill(self.padding)
+
 	def group(self):
 		if self.isSingle():
-			return pathlib.Path(self.parent, f"{self.basename}{self.ext}")
+			return pathlib.Path(self.parent, f"{self.basename}{self._formatIndex(self.min) if self.padding else ''}{self.ext}")
 		else:
-			return pathlib.Path(self.parent, f"{self.basename}[{str(self.min).zfill(self.padding)}-{str(self.max).zfill(self.padding)}]{self.ext}")
+			runs = ','.join(self._formatIndex(start) if start == end else f"{self._formatIndex(start)}-{self._formatIndex(end)}" for start, end in self.frames.ranges())
+			return pathlib.Path(self.parent, f"{self.basename}[{runs}]{self.ext}")
 	
 	def expand(self):
-		if self.isSingle() and self.padding == 0:
-			expanded = [pathlib.Path(self.parent, f"{self.basename}{self.ext}")]
-
-		else:
-			expanded = []
-			for idx in range(self.min, self.max):
-				expanded.append(pathlib.Path(self.parent, f"{self.basename}{str(idx).zfill(self.padding)}{self.ext}"))
-		
-		return expanded
+		"""List of every path in the sequence.  Prefer iterating the sequence directly for long sequences."""
+		return list(self)
 
 	def isSingle(self):
-		return self.min == self.max
-
-
+		return len(self.frames) == 1
@@ -0,0 +1,117 @@
+# upco_ingest.py from upco_tools
+# Build ALEs straight from folders of camera media: scan, probe and write in one pass
+# By Michael Jordan <michael@glowingpixel.com>
+
+from . import upco_filesequence, upco_metadata, upco_shot
+import pathlib, concurrent.futures
+
+# Frame-per-file formats, grouped into one shot per sequence
+IMAGE_EXTENSIONS = (".dpx",".exr",".ari",".dng",".tif",".tiff")
+
+# Clip formats ffprobe can read, probed one shot per file
+MOVIE_EXTENSIONS = (".mov",".mxf",".mp4",".m4v",".avi",".mts",".mkv")
+
+def shotFromMetadata(metadata):
+	"""Build a Shot from a probed media file, named for its reel if it has one"""
+
+	path = metadata.path
+	video = metadata.video
+
+	return upco_shot.Shot(
+		video.get("tape").strip() if metadata.hastapename else path.stem,
+		tc_start = video.get("tc_start"),
+		tc_end   = video.get("tc_end"),
+		frm_rate = video.get("framerate", 24000/1001),
+		metadata = {"Name": path.stem, "Source File": path.name, "Source Path": str(path.parent)}
+	)
+
+def shotFromSequence(seq, framerate=24000/1001):
+	"""Build a Shot from an image sequence, with timecode taken from its frame numbers"""
+
+	seq.framerate = float(framerate)
+	name = seq.basename.rstrip("._- ") or seq.parent.name
+
+	return upco_shot.Shot(
+		name,
+		tc_start = seq.tc_start,
+		tc_end   = seq.tc_end,
+		frm_rate = seq.framerate,
+		metadata = {"Name": name, "Source File": seq.group().name, "Source Path": str(seq.parent)}
+	)
+
+def ingestDirectory(path_input, path_output, recursive=True, max_workers=8, scan_workers=None, native=True, profile=upco_metadata.Metadata.Profile.LEAN, sequence_framerate=24000/1001, columns=None, heading=None, sourcecol="Tape", errors=None):
+	"""
+	Scan a directory of camera media and write an ALE of everything in it, in a single pass.
+
+	Image sequences are grouped with upco_filesequence and become one shot each.  Clips are probed in a pool
+	of threads while the scan continues, and each shot is written to the ALE as soon as its probe finishes,
+	so scanning, probing and writing all overlap.
+
+	Arguments:
+		path_input {str|pathlib.Path} -- Directory to scan
+		path_output {str|pathlib.Path} -- Path of ALE to write
+
+	Keyword Arguments:
+		recursive {bool} -- Also scan subdirectories (default: {True})
+		max_workers {int} -- Number of concurrent probes (default: {8})
+		scan_workers {int} -- Number of threads listing directories; see Sequencer.scanDirectory (default: {None})
+		native {bool} -- Read QuickTime/MXF headers directly where possible; see Metadata (default: {True})
+		profile {Metadata.Profile} -- ffprobe profile for clips that need it (default: {Metadata.Profile.LEAN})
+		sequence_framerate {float} -- Framerate of image sequences, which carry none of their own (default: {23.976})
+		columns {list} -- ALE columns (default: {Name, sourcecol, Start, Duration, End, Source File, Source Path})
+		heading {dict} -- ALE heading; FPS is taken from the first shot if not given (default: {None})
+		sourcecol {str} -- Column holding the shot name (default: {"Tape"})
+		errors {dict} -- If given, files which could not be ingested are recorded here as {path: exception} (default: {None})
+
+	Returns:
+		pathlib.Path -- Path of the written ALE
+	"""
+
+	path_output = pathlib.Path(path_output)
+	columns = columns or ["Name",sourcecol,"Start","Duration","End","Source File","Source Path"]
+	errors = errors if errors is not None else {}
+
+	with path_output.open('w', encoding="utf-8") as file_output, concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+
+		writer = upco_shot.AleWriter(file_output, columns, heading=heading, sourcecol=sourcecol)
+		pending = {}
+
+		def write(build, source):
+			try:
+				writer.writeShot(build())
+			except Exception as e:
+				errors[source] = e
+
+		def collect(block):
+			"""Write out whichever probes have finished, optionally waiting for at least one"""
+			if not pending:
+				return
+			done, _ = concurrent.futures.wait(pending, timeout=None if block else 0, return_when=concurrent.futures.FIRST_COMPLETED)
+			for future in done:
+				path = pending.pop(future)
+				write(lambda: shotFromMetadata(future.result()), path)
+
+		for seq in upco_filesequence.Sequencer().scanDirectory(path_input, recursive=recursive, max_workers=scan_workers):
+
+			ext = seq.ext.lower()
+
+			if ext in IMAGE_EXTENSIONS and seq.padding:
+				write(lambda: shotFromSequence(seq, sequence_framerate), seq.group())
+
+			# Numbered clips (C0001.MXF, C0002.MXF...) group like sequences too, but each file is its own shot
+			elif ext in MOVIE_EXTENSIONS:
+				for path in seq:
+					pending[pool.submit(upco_metadata.Metadata, path, None, True, profile, native)] = path
+
+					# Don't let the scan get too far ahead of the probes
+					if len(pending) >= max_workers * 4:
+						collect(block=True)
+
+			collect(block=False)
+
+		while pending:
+			collect(block=True)
+
+		writer.close()
+
+	return path_output
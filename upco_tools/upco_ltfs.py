@@ -4,8 +4,37 @@
 
 from xml.etree import cElementTree as ElementTree
 from . import upco_shot
-import enum, operator, subprocess, time, pathlib, sqlite3
-import signal
+import enum, operator, subprocess, time, pathlib, sqlite3, array, bisect, functools, re, hashlib, concurrent.futures, datetime
+import signal, os, shutil, shlex, threading, collections, configparser, queue, mmap, struct
+
+try:
+	import xxhash
+except ImportError:
+	xxhash = None
+
+ENV_LTFS = "UPCO_LTFS"
+
+# Find the ltfs command: explicit path or command line, then $UPCO_LTFS, then $PATH, then HPE's Windows install
+# Returns the command as a list, so a stand-in like "python -m upco_tools.upco_ltfs_fake" works too
+def find_ltfs(input_path=None):
+
+	if input_path:
+		searchpaths = [input_path]
+	else:
+		searchpaths = [os.environ.get(ENV_LTFS), shutil.which("ltfs"), r"C:\Program Files\HPE\LTFS\ltfs.exe"]
+	
+	for searchpath in searchpaths:
+		if not searchpath:
+			continue
+		if pathlib.Path(searchpath).is_file():
+			return [str(searchpath)]
+		
+		# Otherwise maybe a command line
+		cmd = shlex.split(str(searchpath), posix=os.name != "nt")
+		if cmd and shutil.which(cmd[0]):
+			return cmd
+	
+	raise Exception("LTFS binary not found on this system.")
 
 # CLASS: Tape ================================================================
 # A Tape object represents an LTFS-formatted LTO tape and its list of Shots
@@ -19,6 +48,14 @@ class Tape:
 	
 	class Status(enum.Enum):
 		LTFS_INACTIVE, LTFS_INIT, LTFS_ACTIVE, INSERT_TAPE, MOUNTED, TAPE_EJECTED, EJECT_ERROR = range(0,7)
+	
+	# Rough drive figures for estimating restore times
+	READ_SPEEDS     = {Density.LTO6: 160e6, Density.LTO7: 300e6, Density.LTO8: 360e6}	# Native bytes/sec
+	BLOCK_SIZE      = 512 * 1024	# LTFS default block size
+	LOAD_TIME       = 120			# Seconds to load, thread and mount a tape, then unload it
+	LOCATE_TIME_MIN = 5				# Seconds to stop and reposition for a short skip
+	LOCATE_TIME_MAX = 90			# Seconds for a locate from one end of the tape to the other
+	LOCATE_FACTOR   = 8				# Locates run this many times faster than reads
 		
 	def __init__(self, name, density=6, dev_name=None, mount_point=None):
 		self.name = name
@@ -62,7 +99,7 @@ class Tape:
 	def setDevice(self, dev_name):
 		self.dev_name = dev_name
 	
-	def mount(self, mount_point=None, dev_name=None):
+	def mount(self, mount_point=None, dev_name=None, path_ltfs=None):
 	
 		if mount_point is not None: self.setMountPoint(mount_point)
 		if dev_name is not None: self.setDevice(dev_name)
@@ -70,29 +107,43 @@ class Tape:
 		if not self.mount_point or not self.dev_name:
 			raise Exception("No mount point or device name specified.")
 		
-		path_ltfsbin = pathlib.Path(r"C:\Program Files\HPE\LTFS\ltfs.exe")
-		if not path_ltfsbin.exists(): raise Exception(f"LTFS binary not found at {path_ltfsbin}")
+		cmd_ltfs = find_ltfs(path_ltfs)
 		
-		self.ltfs_exec = subprocess.Popen([
-			str(path_ltfsbin), str(self.mount_point),		# ltfs.exe G:
+		# HPE's Windows build runs in its own process group so it can be signalled; elsewhere, its own session
+		if os.name == "nt":
+			options = ["-o","show_offline"]								# mark files offline in explorer (prevents thumbnailing)
+			platform = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP, "shell": True}	# allows sending signal to child process tree
+		else:
+			options = []
+			platform = {"start_new_session": True}
+
+		self.ltfs_log = collections.deque(maxlen=200)
+		self.ltfs_started = threading.Event()
+		self.ltfs_exec = subprocess.Popen(cmd_ltfs + [
+			str(self.mount_point),							# ltfs.exe G:
 			"-o","devname={}".format(self.dev_name),		# machine name; ex TAPE0
 			"-o","ro",										# mount as read-only
-			"-o","eject",									# eject after process is terminated
-			"-o","show_offline",							# mark files offline in explorer (prevents thumbnailing)
+			"-o","eject"] + options + [						# eject after process is terminated
 			"-d"],											# run in debug mode
-			creationflags = subprocess.CREATE_NEW_PROCESS_GROUP,	# allows sending signal to child process tree
 			universal_newlines = True,						# PIPEs running in text mode
 			bufsize = 1, 									# line buffering
-			shell = True,									# probably unnecessary
-			stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+			stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **platform)
 			
 		if self.ltfs_exec.poll() is None:
 			self.ltfs_status = self.Status.LTFS_INIT
+			for stream in (self.ltfs_exec.stdout, self.ltfs_exec.stderr):
+				threading.Thread(target=self._drainOutput, args=(stream,), daemon=True).start()
 		else:
 			raise Exception("LTFS driver could not not be loaded: {}".format(self.ltfs_exec.poll()))
 		
 		return self.ltfs_status
-		
+	
+	def _drainOutput(self, stream):
+		"""Keep reading LTFS's output so it never blocks on a full pipe, holding on to the last few lines"""
+		for line in iter(stream.readline, ''):
+			self.ltfs_log.append(line.rstrip())
+			if "LTFS14113I" in line:
+				self.ltfs_started.set()
 		
 	def mount_status(self):
 		
@@ -108,31 +159,23 @@ class Tape:
 		# LTFS has just started
 		if self.ltfs_status == self.Status.LTFS_INIT:
 
-			# Wait for final line of LTFS startup messages
-			while "LTFS14113I" not in self.ltfs_exec.stderr.readline():
-				continue
+			# Give the final line of LTFS startup messages a moment to show up, but leave the waiting to the caller
+			if not self.ltfs_started.wait(timeout=1):
+				return self.ltfs_status
 
 			self.ltfs_status = self.Status.LTFS_ACTIVE
 			return self.ltfs_status
 		
 		# If OS has access to the tape (might not be the best thing here...)
 		try:
-			print("In mountpoint check")
-
 			if self.mount_point.exists():
-				print("Found it")
 				self.ltfs_status = self.Status.MOUNTED
-
-				print("Reading line...")
-				print(self.ltfs_exec.stderr.readline())
-
 				return self.ltfs_status
 
 		except Exception as e:
 			print(f"Passing on OS error: {e}... ehhhh...")
 			pass
 		
-		print("Didn't find it")
 		time.sleep(5)
 			
 		self.ltfs_status = self.Status.INSERT_TAPE
@@ -154,33 +197,29 @@ class Tape:
 		print("Now unmounting {}".format(self.mount_point))
 		
 		try:
-#			Here's where it goes to shit
+			# Interrupting ltfs unmounts and (with -o eject) ejects the tape
+			# On Windows, here's where it goes to shit
+			if os.name != "nt":
+				self.ltfs_exec.send_signal(signal.SIGINT)
 #			os.kill(self.ltfs_exec.pid, signal.CTRL_C_EVENT)
-			# Wait 30 sec and get stderr output
-			stat = self.ltfs_exec.communicate(timeout=30)[1]
-		#except TimeoutExpired:
-		#	print("Timed out waiting for ltfs to clean up...")
+			# Wait 30 sec for ltfs to clean up
+			self.ltfs_exec.wait(timeout=30)
 		
 		except KeyboardInterrupt:
 			print("Caught interrupt")
 			
 		except Exception as e:
 			print("Exception: {}".format(e))
-			subprocess.call(["taskkill","/f","/t","/pid",str(self.ltfs_exec.pid)])
+			if os.name == "nt":
+				subprocess.call(["taskkill","/f","/t","/pid",str(self.ltfs_exec.pid)])
+			else:
+				self.ltfs_exec.kill()
 			self.ltfs_status = self.Status.EJECT_ERROR
 			return self.ltfs_status
 
 
 		self.ltfs_status = self.Status.TAPE_EJECTED
 		return self.ltfs_status
-		#self.ltfs_status = self.Status.LTFS_INACTIVE
-		
-		
-		
-		
-		
-		#print("Killed with code {}".self.ltfs_exec.returncode)
-		#print(self.ltfs_exec.stdout.read())
 		
 		
 		
@@ -270,6 +309,740 @@ class CameraRawPull:
 		else:
 			return "{:.2f} GB".format(size/(1024*1024*1024))
 			
+# CLASS: RestorePlan ===========================================
+# Orders a pull list for restoring: one load per tape, reading each tape front to back
+# Pulls with alternates (CameraRawPull.alts) are restored from whichever tapes cover the most of the list
+class RestorePlan:
+
+	def __init__(self, pulls):
+		self.steps = []
+		self.missing = []
+
+		# Every tape each pull could be restored from
+		options = []
+		for pull in pulls:
+			choices = {str(choice.tape): choice for choice in reversed([pull] + list(pull.alts)) if choice.tape is not None and getattr(choice, "filelist", None)}
+			if choices:
+				options.append(choices)
+			else:
+				self.missing.append(pull)
+		
+		# Greedy set cover: keep loading whichever tape restores the most outstanding pulls (largest total, on a tie)
+		uncovered = set(range(len(options)))
+		while uncovered:
+			coverage = {}
+			for idx in uncovered:
+				for tape_name, choice in options[idx].items():
+					count, size = coverage.get(tape_name, (0,0))
+					coverage[tape_name] = (count + 1, size + choice.getSize())
+			tape_name = max(coverage, key=lambda x: (coverage[x], x))
+
+			pulls_tape = [options[idx][tape_name] for idx in sorted(uncovered) if tape_name in options[idx]]
+			uncovered -= {idx for idx in uncovered if tape_name in options[idx]}
+			self.steps.append(self._planTape(pulls_tape))
+	
+	@staticmethod
+	def _planTape(pulls):
+		"""Files of all pulls from one tape in startblock order, with an estimate of how long they'll take to read"""
+
+		tape = pulls[0].tape
+		files = {}
+		for pull in pulls:
+			for file in pull.filelist:
+				path = pathlib.Path(pull.basepath, file.get("path"))
+				files.setdefault(str(path), {"shot": pull.shot, "path": path, "size": file.get("size",0), "startblock": file.get("startblock",0)})
+		files = sorted(files.values(), key=lambda x: x.get("startblock"))
+
+		# Reads are linear from here, but skipping over anything not needed means a locate
+		speed = Tape.READ_SPEEDS.get(tape.density, Tape.READ_SPEEDS.get(Tape.Density.LTO6))
+		seconds = Tape.LOAD_TIME
+		next_block = None
+		for file in files:
+			if next_block is not None and file.get("startblock") > next_block:
+				seconds += min(Tape.LOCATE_TIME_MAX, Tape.LOCATE_TIME_MIN + (file.get("startblock") - next_block) * Tape.BLOCK_SIZE / (speed * Tape.LOCATE_FACTOR))
+			seconds += file.get("size") / speed
+			next_block = file.get("startblock") + -(-file.get("size") // Tape.BLOCK_SIZE)
+
+		return {"tape": tape, "pulls": pulls, "files": files, "size": sum(file.get("size") for file in files), "seconds": seconds}
+
+	def getSize(self):
+		return sum(step.get("size") for step in self.steps)
+	
+	def getEstimatedTime(self):
+		"""Estimated seconds to restore everything, one tape after another"""
+		return sum(step.get("seconds") for step in self.steps)
+	
+	def __iter__(self):
+		return iter(self.steps)
+	
+	def __len__(self):
+		return len(self.steps)
+	
+	def __str__(self):
+		lines = []
+		for idx, step in enumerate(self.steps, 1):
+			lines.append(f"{idx}. {step.get('tape')} ({step.get('tape').density}): {len(step.get('pulls'))} shots, {len(step.get('files'))} files, {step.get('size')/(1024*1024*1024):.2f} GB, est. {datetime.timedelta(seconds=round(step.get('seconds')))}")
+		lines.append(f"Total: {len(self.steps)} tapes, {self.getSize()/(1024*1024*1024):.2f} GB, est. {datetime.timedelta(seconds=round(self.getEstimatedTime()))}")
+		if self.missing:
+			lines.append(f"Not found: {', '.join(str(pull) for pull in self.missing)}")
+		return '\n'.join(lines)
+
+# Drive config ===================================================
+# INI file listing the ltfs command and the drives available for restores:
+#
+#   [ltfs]
+#   command = /usr/local/bin/ltfs
+#
+#   [drive:DRIVE0]
+#   device = /dev/sg0
+#   mount_point = /mnt/ltfs0
+#
+def read_drive_config(path_config):
+	"""Returns (ltfs command or None, list of drive dicts with "name", "device" and "mount_point")"""
+
+	config = configparser.ConfigParser()
+	if not config.read(path_config):
+		raise Exception(f"Could not read drive config at {path_config}")
+	
+	drives = []
+	for section in config.sections():
+		if not section.lower().startswith("drive:"):
+			continue
+		try:
+			drives.append({"name": section.split(':',1)[1].strip(), "device": config.get(section, "device"), "mount_point": pathlib.Path(config.get(section, "mount_point"))})
+		except configparser.Error as e:
+			raise Exception(f"Invalid drive config for {section}: {e}")
+	
+	if not drives:
+		raise Exception(f"No drives listed in {path_config}")
+	
+	return config.get("ltfs", "command", fallback=None), drives
+
+# CLASS: RestoreScheduler ======================================
+# Runs a RestorePlan across several drives at once
+# Each drive takes the next tape as soon as it's free, longest tapes first, then mounts it, copies its files and unmounts it
+class RestoreScheduler:
+
+	def __init__(self, plan, drives, path_output, path_ltfs=None, loader=None, copier=None, mount_timeout=600):
+		"""
+		Arguments:
+			plan {RestorePlan} -- Tapes and files to restore
+			drives {list} -- Drive dicts with "name", "device" and "mount_point"; see read_drive_config
+			path_output {str|pathlib.Path} -- Directory to restore into
+
+		Keyword Arguments:
+			path_ltfs {str} -- ltfs binary or command line; see find_ltfs (default: {None})
+			loader {callable} -- Called as loader(tape, drive) to get a tape into a drive before mounting, for an autoloader or an operator prompt (default: {None})
+			copier {callable} -- Called as copier(step, mount_point, path_output) to copy a plan step's files, returning bytes copied (default: {copy_step})
+			mount_timeout {int} -- Seconds to wait for a tape to mount (default: {600})
+		"""
+
+		self.plan = plan
+		self.drives = drives
+		self.path_output = pathlib.Path(path_output)
+		self.path_ltfs = path_ltfs
+		self.loader = loader
+		self.copier = copier or copy_step
+		self.mount_timeout = mount_timeout
+
+		self.report = {drive.get("name"): {"tapes": [], "bytes": 0, "seconds_busy": 0.0, "seconds_copying": 0.0} for drive in drives}
+		self.errors = {}
+		self._lock = threading.Lock()
+	
+	@classmethod
+	def fromConfig(cls, plan, path_config, path_output, **kwargs):
+		path_ltfs, drives = read_drive_config(path_config)
+		kwargs.setdefault("path_ltfs", path_ltfs)
+		return cls(plan, drives, path_output, **kwargs)
+
+	def run(self):
+		"""Restore everything in the plan, returning the per-drive report"""
+
+		steps = queue.Queue()
+		for step in sorted(self.plan, reverse=True, key=lambda x: x.get("seconds")):
+			steps.put(step)
+
+		threads = [threading.Thread(target=self._runDrive, args=(drive, steps), name=drive.get("name")) for drive in self.drives]
+		{thread.start() for thread in threads}
+		{thread.join() for thread in threads}
+
+		return self.report
+	
+	def _runDrive(self, drive, steps):
+		
+		while True:
+			try:
+				step = steps.get_nowait()
+			except queue.Empty:
+				return
+			
+			tape = step.get("tape")
+			time_start = time.monotonic()
+			try:
+				if self.loader:
+					self.loader(tape, drive)
+				self._mountTape(tape, drive)
+				
+				try:
+					time_copy = time.monotonic()
+					size = self.copier(step, drive.get("mount_point"), self.path_output)
+					time_copy = time.monotonic() - time_copy
+				finally:
+					tape.unmount()
+
+			except Exception as e:
+				with self._lock:
+					self.errors[str(tape)] = e
+				continue
+			
+			with self._lock:
+				stats = self.report.get(drive.get("name"))
+				stats["tapes"].append(str(tape))
+				stats["bytes"] += size
+				stats["seconds_copying"] += time_copy
+				stats["seconds_busy"] += time.monotonic() - time_start
+	
+	def _mountTape(self, tape, drive):
+		"""Mount a tape and wait for it to show up at the drive's mount point"""
+
+		tape.mount(drive.get("mount_point"), drive.get("device"), self.path_ltfs)
+		deadline = time.monotonic() + self.mount_timeout
+
+		while True:
+			status = tape.mount_status()
+			if status == Tape.Status.MOUNTED:
+				return
+			elif status == Tape.Status.LTFS_INACTIVE:
+				raise Exception(f"LTFS exited while mounting {tape} in {drive.get('name')}: {' / '.join(list(tape.ltfs_log)[-3:])}")
+			elif time.monotonic() > deadline:
+				tape.unmount()
+				raise Exception(f"Timed out mounting {tape} in {drive.get('name')}")
+	
+	def getThroughput(self, drive_name):
+		"""Average bytes/sec a drive copied while it was copying"""
+		stats = self.report.get(drive_name)
+		return stats.get("bytes") / stats.get("seconds_copying") if stats.get("seconds_copying") else 0.0
+
+	def __str__(self):
+		lines = []
+		for drive_name, stats in self.report.items():
+			lines.append(f"{drive_name}: {len(stats.get('tapes'))} tapes ({', '.join(stats.get('tapes'))}), {stats.get('bytes')/(1024*1024*1024):.2f} GB at {self.getThroughput(drive_name)/(1024*1024):.1f} MB/s, busy {datetime.timedelta(seconds=round(stats.get('seconds_busy')))}")
+		for tape_name, error in self.errors.items():
+			lines.append(f"Failed: {tape_name}: {error}")
+		return '\n'.join(lines)
+
+def copy_step(step, mount_point, path_output):
+	"""Copy a RestorePlan step's files off a mounted tape with a CopyEngine, writing a manifest for the tape.  Returns bytes copied."""
+
+	path_output = pathlib.Path(path_output)
+	path_output.mkdir(parents=True, exist_ok=True)
+	errors = {}
+	results = CopyEngine().copyFiles(step.get("files"), mount_point, path_output, path_manifest=pathlib.Path(path_output, f"{step.get('tape')}.manifest.txt"), errors=errors)
+	if errors:
+		raise Exception(f"{len(errors)} file(s) could not be copied from {step.get('tape')}, starting with {next(iter(errors))}: {next(iter(errors.values()))}")
+	return sum(result.get("size") for result in results)
+
+# CLASS: CopyEngine ============================================
+# Copies files off a mounted tape in startblock order, so the tape only ever streams forward
+# One thread reads into a pair of page-aligned buffers while the other writes and checksums the last one,
+# so the checksums describe exactly what came off the tape and no second verification pass is needed
+class CopyEngine:
+
+	def __init__(self, buffer_size=8*1024*1024, checksums=None):
+		"""
+		Keyword Arguments:
+			buffer_size {int} -- Bytes per read, rounded up to whole tape blocks (default: {8 MB})
+			checksums {list} -- Checksums to compute: "md5", and "xxh64" if the xxhash module is installed (default: {all available})
+		"""
+
+		self.buffer_size = max(1, -(-buffer_size // Tape.BLOCK_SIZE)) * Tape.BLOCK_SIZE
+		self.checksums = list(checksums) if checksums is not None else ["md5"] + (["xxh64"] if xxhash else [])
+		if "xxh64" in self.checksums and not xxhash:
+			raise Exception("xxh64 checksums need the xxhash module, which isn't installed")
+
+	def _newHashes(self):
+		return {name: hashlib.md5() if name == "md5" else xxhash.xxh64() if name == "xxh64" else hashlib.new(name) for name in self.checksums}
+
+	def copyPull(self, pull, source_root, path_output, path_manifest=None, errors=None):
+		"""Copy every file of a CameraRawPull.  See copyFiles."""
+		files = [{"path": pathlib.Path(pull.basepath, file.get("path")), "size": file.get("size",0), "startblock": file.get("startblock",0)} for file in pull.filelist]
+		return self.copyFiles(files, source_root, path_output, path_manifest, errors)
+	
+	def copyFiles(self, files, source_root, path_output, path_manifest=None, errors=None):
+		"""
+		Copy files in startblock order, checksumming them on the way through
+
+		Arguments:
+			files {list} -- Dicts (or FileRecords) with "path" on tape, "size" and "startblock"
+			source_root {str|pathlib.Path} -- Where the tape is mounted
+			path_output {str|pathlib.Path} -- Directory to copy into, keeping each file's path on tape
+
+		Keyword Arguments:
+			path_manifest {str|pathlib.Path} -- Write a tab-delimited manifest of paths, sizes and checksums here (default: {None})
+			errors {dict} -- If given, files which could not be copied are recorded here as {path: exception} (default: {None})
+
+		Returns:
+			list -- Dicts of "path", "size" and each checksum, per copied file, in the order they were read
+		"""
+
+		source_root, path_output = pathlib.Path(source_root), pathlib.Path(path_output)
+		errors = errors if errors is not None else {}
+		files = sorted(files, key=lambda x: x.get("startblock",0))
+
+		# Two page-aligned buffers: one filling from tape while the other drains to disk
+		free, filled = queue.Queue(), queue.Queue()
+		{free.put(memoryview(mmap.mmap(-1, self.buffer_size))) for x in range(2)}
+		stop = threading.Event()
+
+		def relativePath(file):
+			path_tape = pathlib.Path(file.get("path"))
+			return path_tape.relative_to(path_tape.anchor) if path_tape.anchor else path_tape
+
+		def removePartial(path_partial):
+			try:
+				path_partial.unlink()
+			except FileNotFoundError:
+				pass
+
+		def read():
+			for idx, file in enumerate(files):
+				if stop.is_set(): break
+				try:
+					with open(pathlib.Path(source_root, relativePath(file)), "rb", buffering=0) as file_input:
+						filled.put(("start", idx, None, 0))
+						while not stop.is_set():
+							buffer = free.get()
+							length = file_input.readinto(buffer)
+							if not length:
+								free.put(buffer)
+								break
+							filled.put(("data", idx, buffer, length))
+					filled.put(("end", idx, None, 0))
+				except Exception as e:
+					filled.put(("error", idx, e, 0))
+			filled.put(None)
+		
+		reader = threading.Thread(target=read, daemon=True)
+		reader.start()
+
+		results = []
+		file_output = path_dest = dest_idx = hashes = None
+		try:
+			for event, idx, data, length in iter(filled.get, None):
+				try:
+					if event == "start":
+						path_dest = pathlib.Path(path_output, relativePath(files[idx]))
+						path_dest.parent.mkdir(parents=True, exist_ok=True)
+						file_output = open(path_dest, "wb", buffering=0)
+						dest_idx = idx
+						hashes = self._newHashes()
+						size = 0
+					
+					# Skip over the rest of a file that's already failed, but always hand the buffer back
+					elif event == "data":
+						try:
+							if file_output is not None:
+								with data[:length] as view:
+									file_output.write(view)
+									{checksum.update(view) for checksum in hashes.values()}
+								size += length
+						finally:
+							free.put(data)
+					
+					elif event == "end" and file_output is not None:
+						file_output.close()
+						file_output = None
+						if size != files[idx].get("size", size):
+							raise Exception(f"Expected {files[idx].get('size')} bytes but read {size}")
+						results.append(dict({"path": files[idx].get("path"), "size": size}, **{name: checksum.hexdigest() for name, checksum in hashes.items()}))
+						dest_idx = None
+					
+					elif event == "error":
+						raise data
+
+				# Don't leave a partial copy behind, whichever side failed
+				except Exception as e:
+					errors[files[idx].get("path")] = e
+					if dest_idx == idx:
+						if file_output is not None:
+							file_output.close()
+							file_output = None
+						removePartial(path_dest)
+						dest_idx = None
+			
+		finally:
+			# If anything went wrong out here, let the reader finish up so it isn't left waiting on a buffer
+			stop.set()
+			if file_output is not None: file_output.close()
+			if dest_idx is not None: removePartial(path_dest)
+			while reader.is_alive():
+				try:
+					event, idx, data, length = filled.get(timeout=0.1) or (None, None, None, None)
+					if event == "data": free.put(data)
+				except queue.Empty:
+					pass
+
+		if path_manifest is not None:
+			self.writeManifest(results, path_manifest)
+		
+		return results
+	
+	def writeManifest(self, results, path_manifest):
+		"""Write copied files, sizes and checksums as a tab-delimited manifest"""
+		with open(path_manifest, "w", encoding="utf-8", newline='') as file_manifest:
+			file_manifest.write('\t'.join(["Path","Size"] + [name.upper() for name in self.checksums]) + '\n')
+			for result in results:
+				file_manifest.write('\t'.join([str(result.get("path")), str(result.get("size"))] + [result.get(name) for name in self.checksums]) + '\n')
+
+# CLASS: FileRecord ============================================
+# A file on tape, as listed by Schema.iterSchema
+# Supports .get() and ["key"] like the dicts CameraRawPull filelists used to hold
+class FileRecord:
+	__slots__ = ("name", "size", "startblock", "dirpath", "root", "_path")
+
+	def __init__(self, name, size, startblock, dirpath="", root=pathlib.Path('.')):
+		self.name = name
+		self.size = size
+		self.startblock = startblock
+		self.dirpath = dirpath
+		self.root = root
+		self._path = None
+	
+	# Path objects are only built for records that are asked for one
+	@property
+	def path(self):
+		if self._path is None:
+			self._path = pathlib.Path(self.root, self.dirpath, self.name)
+		return self._path
+	
+	def get(self, key, default=None):
+		return getattr(self, key, default) if key in ("path","size","startblock") else default
+	
+	def __getitem__(self, key):
+		if key not in ("path","size","startblock"):
+			raise KeyError(key)
+		return getattr(self, key)
+	
+	def __repr__(self):
+		return f"FileRecord({str(self.path)!r}, size={self.size}, startblock={self.startblock})"
+
+def file_stem(name):
+	"""Same as pathlib's stem, without building a Path"""
+	idx = name.rfind('.')
+	return name[:idx] if 0 < idx < len(name) - 1 else name
+
+# Read-only list of strings held as UTF-8 in one buffer, separated by NULs
+# Single strings are decoded as they're asked for; iterating decodes the lot in one go and keeps them
+class _StringTable:
+
+	def __init__(self, offsets, blob):
+		self.offsets = offsets
+		self.blob = blob
+		self._strings = None
+	
+	def __len__(self):
+		return len(self.offsets) - 1
+	
+	def __getitem__(self, idx):
+		if self._strings is not None:
+			return self._strings[idx]
+		if idx < 0: idx += len(self)
+		if not 0 <= idx < len(self):
+			raise IndexError("String table index out of range")
+		return str(self.blob[self.offsets[idx]:self.offsets[idx+1] - 1], "utf-8")
+	
+	def __iter__(self):
+		if self._strings is None:
+			self._strings = str(self.blob, "utf-8").split('\0')[:-1] if len(self) else []
+		return iter(self._strings)
+
+# CLASS: SchemaTable ===========================================
+# Compact table of the directories and files in an LTFS index
+# Built with a streaming parse, so the XML tree is never held in memory
+class SchemaTable:
+
+	def __init__(self):
+
+		# Directories, numbered in the order they open in the index (0 is the volume itself)
+		self.dir_names       = []
+		self.dir_parents     = array.array('q')		# -1 for the volume
+		self.dir_file_start  = array.array('q')		# Files of each directory are contiguous in the file table
+		self.dir_file_count  = array.array('q')
+		self.dir_child_start = array.array('q')		# Subdirectories of each directory are contiguous in dir_children
+		self.dir_child_count = array.array('q')
+		self.dir_children    = array.array('q')
+
+		# Files
+		self.file_names       = []
+		self.file_sizes       = array.array('q')
+		self.file_startblocks = array.array('q')	# -1 if the file has no extent info
+
+		# Shots pre-matched with the default naming patterns, when loaded from an index
+		self.candidates = None
+		self.candidates_hash = None
+
+		self._dir_paths = None
+
+	@classmethod
+	def fromXml(cls, path_schema, base_dir="LTFS VOLUME", root_tag="ltfsindex"):
+		"""Parse an LTFS index with iterparse, clearing each element once it has been read"""
+
+		table = cls()
+		children = []		# Subdirectory lists, flattened into dir_children at the end
+		elements = []		# Open elements
+		dirs = []			# Open directories: [index, buffered files]
+		file_entry = None	# [name, length, startblock] of the open file
+
+		for event, elem in ElementTree.iterparse(str(path_schema), events=("start","end")):
+			
+			if event == "start":
+
+				# Validate schema on the very first element
+				if not elements and elem.tag != root_tag:
+					raise Exception("This XML file does not appear to be a valid LTFS schema: Expected root node \"{}\", found \"{}\" instead.".format(root_tag, elem.tag))
+				
+				elements.append(elem)
+
+				if elem.tag == "directory":
+					index = len(table.dir_names)
+					table.dir_names.append(None)
+					table.dir_parents.append(dirs[-1][0] if dirs else -1)
+					table.dir_file_start.append(0)
+					table.dir_file_count.append(0)
+					children.append([])
+					if dirs:
+						children[dirs[-1][0]].append(index)
+					dirs.append([index, []])
+				
+				elif elem.tag == "file":
+					file_entry = [None, None, -1]
+
+				continue
+			
+			# End of an element
+			elements.pop()
+			parent = elements[-1] if elements else None
+
+			if elem.tag == "name" and parent is not None:
+				if parent.tag == "file" and file_entry is not None:
+					file_entry[0] = elem.text or ''
+				elif parent.tag == "directory" and dirs:
+					table.dir_names[dirs[-1][0]] = elem.text or ''
+			
+			elif elem.tag == "length" and file_entry is not None:
+				file_entry[1] = int(elem.text)
+			
+			elif elem.tag == "startblock" and file_entry is not None and file_entry[2] == -1:
+				file_entry[2] = int(elem.text)
+
+			elif elem.tag == "file":
+				if file_entry[0] is not None and dirs:
+					dirs[-1][1].append((file_entry[0], file_entry[1] or 0, file_entry[2]))
+				file_entry = None
+				elem.clear()
+				if parent is not None: parent.clear()
+			
+			elif elem.tag == "directory":
+
+				# Files of a directory are written out together, once it closes
+				index, files = dirs.pop()
+				table.dir_file_start[index] = len(table.file_names)
+				table.dir_file_count[index] = len(files)
+				for name, size, startblock in files:
+					table.file_names.append(name)
+					table.file_sizes.append(size)
+					table.file_startblocks.append(startblock)
+				
+				elem.clear()
+				if parent is not None: parent.clear()
+		
+		if not table.dir_names:
+			raise Exception("This XML file does not appear to be a valid LTFS schema: No volume directory found")
+		
+		for subdirs in children:
+			table.dir_child_start.append(len(table.dir_children))
+			table.dir_child_count.append(len(subdirs))
+			table.dir_children.extend(subdirs)
+		
+		table.base_dir = base_dir
+		return table
+
+	@staticmethod
+	def joinPath(prefix, name, base_dir="LTFS VOLUME"):
+		"""Join a directory name onto a path string.  The LTFS base directory starts over at the root (/)."""
+		if name == base_dir:
+			return '/' + name
+		return f"{prefix}/{name}" if prefix else name
+
+	def dirPath(self, index):
+		"""Path of a directory relative to the volume, as a string"""
+
+		if self._dir_paths is None:
+			self._dir_paths = [""] * len(self.dir_names)
+			for idx in range(1, len(self.dir_names)):	# Parents always open before their children
+				self._dir_paths[idx] = self.joinPath(self._dir_paths[self.dir_parents[idx]], self.dir_names[idx], self.base_dir)
+		return self._dir_paths[index]
+
+	def loadNames(self):
+		"""Decode every name up front, for walks over the whole table.  Tables read from an index otherwise decode names one at a time."""
+		{iter(names) for names in (self.dir_names, self.file_names)}
+
+	def dirFiles(self, index):
+		"""Range of file indices in a directory (not including subdirectories)"""
+		return range(self.dir_file_start[index], self.dir_file_start[index] + self.dir_file_count[index])
+
+	def dirChildren(self, index):
+		"""Indices of the subdirectories of a directory, in index order"""
+		start = self.dir_child_start[index]
+		return self.dir_children[start:start + self.dir_child_count[index]]
+
+	def iterFiles(self, index=0, prefix=""):
+		"""Yield (file index, directory path string) for every file under a directory, walking iteratively"""
+
+		pending = [(index, prefix)]
+		while pending:
+			index, path = pending.pop()
+			for file_index in self.dirFiles(index):
+				yield file_index, path
+			pending.extend((child, self.joinPath(path, self.dir_names[child], self.base_dir)) for child in reversed(self.dirChildren(index)))
+
+	def iterDirs(self, index=0):
+		"""Yield every directory under (not including) a directory, depth-first in index order"""
+
+		pending = list(reversed(self.dirChildren(index)))
+		while pending:
+			index = pending.pop()
+			yield index
+			pending.extend(reversed(self.dirChildren(index)))
+
+	# Binary index ==========================================
+	# A compact copy of the table, saved next to the .schema so later runs can map it in instead of parsing XML
+	# Header, then length-prefixed sections, each padded to 8 bytes.  Numbers are native-endian int64.
+	INDEX_MAGIC   = b"UPCOIDX1"
+	INDEX_VERSION = 1
+	INDEX_HEADER  = struct.Struct("=8sIIqq20s20sqqqq")	# magic, version, byte order, schema size, schema mtime_ns, schema sha1, patterns sha1, dirs, files, children, candidates
+	INDEX_BYTE_ORDER = 0x01020304
+
+	def saveIndex(self, path_index, schema_size, schema_mtime_ns, schema_hash, patterns_hash=b'', candidates=None):
+		"""
+		Write the table to a binary index, replacing any earlier one
+
+		Arguments:
+			path_index {str|pathlib.Path} -- Where to write the index
+			schema_size {int} -- Size of the .schema file this table came from
+			schema_mtime_ns {int} -- Modification time of the .schema file
+			schema_hash {str} -- SHA-1 of the .schema file, as hex
+
+		Keyword Arguments:
+			patterns_hash {bytes} -- SHA-1 of the naming patterns the candidates were matched with (default: {b''})
+			candidates {list} -- Pre-matched shots as (CameraRawPull.Type, directory or file index, directory index, shot name) (default: {None})
+		"""
+
+		def strings(values):
+			encoded = [value.encode("utf-8") + b'\0' for value in values]
+			offsets = array.array('q', [0])
+			for value in encoded:
+				offsets.append(offsets[-1] + len(value))
+			return [offsets.tobytes(), b''.join(encoded)]
+		
+		candidates = candidates or []
+		sections = [array.array('q', values).tobytes() for values in (self.dir_parents, self.dir_file_start, self.dir_file_count, self.dir_child_start, self.dir_child_count, self.dir_children, self.file_sizes, self.file_startblocks)]
+		sections += strings(self.dir_names) + strings(self.file_names)
+		sections += [array.array('q', (1 if kind == CameraRawPull.Type.DIR else 0 for kind, index, dir_index, name in candidates)).tobytes(),
+					 array.array('q', (index for kind, index, dir_index, name in candidates)).tobytes(),
+					 array.array('q', (dir_index for kind, index, dir_index, name in candidates)).tobytes()]
+		sections += strings(name for kind, index, dir_index, name in candidates)
+
+		# Written alongside, then swapped in, so a reader never sees half an index
+		path_index = pathlib.Path(path_index)
+		path_temp = path_index.with_name(f"{path_index.name}.{os.getpid()}.tmp")
+		try:
+			with open(path_temp, "wb") as file_index:
+				file_index.write(self.__class__.INDEX_HEADER.pack(self.__class__.INDEX_MAGIC, self.__class__.INDEX_VERSION, self.__class__.INDEX_BYTE_ORDER, schema_size, schema_mtime_ns, bytes.fromhex(schema_hash), patterns_hash.ljust(20, b'\0'), len(self.dir_names), len(self.file_names), len(self.dir_children), len(candidates)))
+				for section in sections:
+					file_index.write(struct.pack("=q", len(section)))
+					file_index.write(section)
+					file_index.write(b'\0' * (-len(section) % 8))
+			os.replace(path_temp, path_index)
+		finally:
+			if path_temp.exists(): path_temp.unlink()
+
+	@classmethod
+	def readIndexHeader(cls, path_index):
+		"""Header of a binary index as a dict, or None if it isn't one this version can use"""
+
+		try:
+			with open(path_index, "rb") as file_index:
+				header = file_index.read(cls.INDEX_HEADER.size)
+			magic, version, byte_order, schema_size, schema_mtime_ns, schema_hash, patterns_hash, count_dirs, count_files, count_children, count_candidates = cls.INDEX_HEADER.unpack(header)
+		except (OSError, struct.error):
+			return None
+		
+		if magic != cls.INDEX_MAGIC or version != cls.INDEX_VERSION or byte_order != cls.INDEX_BYTE_ORDER:
+			return None
+		return {"size": schema_size, "mtime_ns": schema_mtime_ns, "hash": schema_hash.hex(), "patterns_hash": patterns_hash.rstrip(b'\0'), "dirs": count_dirs, "files": count_files, "children": count_children, "candidates": count_candidates}
+
+	@classmethod
+	def updateIndexMtime(cls, path_index, schema_mtime_ns):
+		"""Record a new modification time for the .schema file in an index's header, for a schema that was touched but not changed"""
+
+		with open(path_index, "r+b") as file_index:
+			fields = list(cls.INDEX_HEADER.unpack(file_index.read(cls.INDEX_HEADER.size)))
+			fields[4] = schema_mtime_ns
+			file_index.seek(0)
+			file_index.write(cls.INDEX_HEADER.pack(*fields))
+
+	@classmethod
+	def fromIndex(cls, path_index, base_dir="LTFS VOLUME"):
+		"""Map a binary index written by saveIndex.  Arrays are views straight into the mapped file; names are decoded as they're read."""
+
+		header = cls.readIndexHeader(path_index)
+		if header is None:
+			raise Exception(f"{path_index} is not a usable schema index")
+
+		with open(path_index, "rb") as file_index:
+			buffer = mmap.mmap(file_index.fileno(), 0, access=mmap.ACCESS_READ)
+		view = memoryview(buffer)
+		
+		sections = []
+		offset = cls.INDEX_HEADER.size
+		while offset < len(view):
+			if offset + 8 > len(view):
+				raise Exception(f"{path_index} is truncated")
+			length = struct.unpack_from("=q", view, offset)[0]
+			if length < 0 or offset + 8 + length > len(view):
+				raise Exception(f"{path_index} is truncated")
+			sections.append(view[offset + 8:offset + 8 + length])
+			offset += 8 + length + (-length % 8)
+		
+		# A stale or cut-off index must not be trusted, so every section has to match the counts in the header
+		count_dirs, count_files, count_children, count_candidates = (header.get(key) for key in ("dirs","files","children","candidates"))
+		expected = [count_dirs]*5 + [count_children] + [count_files]*2 + [count_dirs+1, None, count_files+1, None] + [count_candidates]*3 + [count_candidates+1, None]
+		if count_dirs < 1 or len(sections) != len(expected):
+			raise Exception(f"{path_index} doesn't match its header")
+		for idx, count in enumerate(expected):
+			if count is None:
+				offsets = sections[idx-1].cast('q')
+				valid = offsets[0] == 0 and offsets[-1] == len(sections[idx])
+			else:
+				valid = len(sections[idx]) == count * 8
+			if not valid:
+				raise Exception(f"{path_index} doesn't match its header")
+
+		table = cls()
+		table._mmap = buffer
+		(table.dir_parents, table.dir_file_start, table.dir_file_count, table.dir_child_start, table.dir_child_count, table.dir_children, table.file_sizes, table.file_startblocks) = (section.cast('q') for section in sections[:8])
+		table.dir_names  = _StringTable(sections[8].cast('q'), sections[9])
+		table.file_names = _StringTable(sections[10].cast('q'), sections[11])
+		
+		kinds, indices, dir_indices = (section.cast('q') for section in sections[12:15])
+		names = _StringTable(sections[15].cast('q'), sections[16])
+		table.candidates = [(CameraRawPull.Type.DIR if kinds[idx] else CameraRawPull.Type.FILE, indices[idx], dir_indices[idx], names[idx]) for idx in range(len(kinds))]
+		table.candidates_hash = header.get("patterns_hash")
+		
+		table.base_dir = base_dir
+		return table
+
 # CLASS: Schema ================================================
 # Parses the schema representation of a Tape from a .schema file
 # Also contains functions for indexing Shots
@@ -277,8 +1050,26 @@ class Schema:
 	LTFS_BASE_DIR	= "LTFS VOLUME"
 	LTFS_NODE_ROOT = "ltfsindex"
 
-	def __init__(self, path_schema, debug=False):
+	# Camera file naming conventions recognized by findAllShots, in order of precedence
+	CAMERA_PATTERNS = (
+		r"[a-z][0-9]{3}c[0-9]{3}_[0-9]{6}_[a-z][a-z0-9]{3}",	# ArriRAW
+		r"[a-z][0-9]{3}_[c,l,r][0-9]{3}_[0-9]{4}[a-z0-9]{2}",	# Redcode
+		r"[a-z][0-9]{3}[c,l,r][0-9]{3}_[0-9]{6}[a-z0-9]{2}",	# Sony Raw
+		r"[a-z][0-9]{3}_[0-9]{8}_C[0-9]{3}",					# Black Magic Cinema Camera
+		r"IMG_[0-9]+",											# iPhone/DSLR
+		r"DJI_[0-9]+",											# DJI Drones
+		r"MVI_[0-9]+",											# Consumer cameras
+		r"[A-Z]\d{3}G[A-Z]\d{3,}",								# GoPro Footage (Nobody)
+		r"[A-Z]\d{3}_P\d{3,}",									# Panasonic Lumix (Nobody)
+		r"LR\d{8}",												# Fast 9 35mm
+		r"CA35_\d{3}",											# Fast 9 35mm
+		r"D[A-Z]\d{3}_S\d{3}_S\d{3}_T\d{3}",					# Fast 9 Drone
+		r"[A-Z]\d{3}_DPX"										# Fast 9 Crash Cam
+	)
+
+	def __init__(self, path_schema, debug=False, use_index=True):
 		self.debug = debug
+		self.use_index = use_index
 		# For now let's assume this baby already exists and we're reading it in
 		if not isinstance(path_schema, pathlib.Path):
 			try:
@@ -293,283 +1084,371 @@ class Schema:
 		except Exception as e:
 			raise Exception(f"Problem parsing schema: {e}")
 		
-	# FUNC: parseSchema - Parses XML, validates as LTFS schema, and grabs the root node
+	# FUNC: compilePatterns
+	# Combines naming patterns into a single alternation of named groups, cached so it's only ever compiled once
+	# Alternatives are tried left to right, so the first pattern to match a name still wins
+	@staticmethod
+	@functools.lru_cache(maxsize=16)
+	def compilePatterns(patterns):
+		return re.compile("|".join(f"(?P<pattern_{idx}>{pat})" for idx, pat in enumerate(patterns)), re.I)
+
+	@staticmethod
+	def hashPatterns(patterns):
+		return hashlib.sha1("\n".join(patterns).encode("utf-8")).digest()
+
+	# FUNC: parseSchema - Streams the XML into a compact SchemaTable, validating it as an LTFS schema along the way
 	# Called by constructor.  Maybe grab more properties in the future (LTO flavor, which we'll need to do now that I'm thinking about it)
+	# Uses the binary index next to the schema instead, if it's still good, and writes one if not
 	def parseSchema(self):
+		self.schema_root = 0
+		self.schema_table = self.loadIndex() if self.use_index else None
+
+		if self.schema_table is None:
+			try:
+				self.schema_table = SchemaTable.fromXml(self.path_schema, base_dir=self.__class__.LTFS_BASE_DIR, root_tag=self.__class__.LTFS_NODE_ROOT)
+			except ElementTree.ParseError as e:
+				raise Exception("This does not appear to be a valid XML file: {}".format(e))
+			if self.use_index:
+				self.saveIndex()
+
+		# Get initial info about this schema: LTO Volume Label and a handle into its root directory
+		self.schema_volume = self.schema_table.dir_names[0]
+	
+	def getIndexPath(self):
+		return self.path_schema.with_name(self.path_schema.name + ".idx")
+	
+	# FUNC: loadIndex
+	# Maps the binary index, if it was made from this schema as it is now: same size, and same mtime or contents
+	# If only the mtime changed, the index takes the new one so the schema isn't hashed again next time
+	# Returns None if there's no usable index
+	def loadIndex(self):
+		path_index = self.getIndexPath()
+		header = SchemaTable.readIndexHeader(path_index)
+		if header is None:
+			return None
+		
 		try:
-			with open(self.path_schema, 'r') as xml_file:
-				self.schema_parsed = ElementTree.parse(xml_file)
+			stat = self.path_schema.stat()
+			if header.get("size") != stat.st_size:
+				return None
+			touched = header.get("mtime_ns") != stat.st_mtime_ns
+			if touched and header.get("hash") != hash_file(self.path_schema):
+				return None
+			table = SchemaTable.fromIndex(path_index, base_dir=self.__class__.LTFS_BASE_DIR)
 		except Exception as e:
-			raise Exception("This does not appear to be a valid XML file: {}".format(e))
-
-		# Validate schema
-		if self.schema_parsed.getroot().tag != self.__class__.LTFS_NODE_ROOT:
-			raise Exception("This XML file does not appear to be a valid LTFS schema: Expected root node \"{}\", found \"{}\" instead.".format(self.__class__.LTFS_NODE_ROOT, self.schema_parsed.getroot().tag))
+			if self.debug: print(f"Ignoring schema index {path_index}: {e}")
+			return None
 		
-		# Get initial info about this schema: LTO Volume Label and a handle into its root directory
-		self.schema_volume = self.schema_parsed.getroot().tag
-		self.schema_root = self.schema_parsed.getroot().find("directory/contents")
+		if touched:
+			try:
+				SchemaTable.updateIndexMtime(path_index, stat.st_mtime_ns)
+			except OSError as e:
+				if self.debug: print(f"Could not update schema index {path_index}: {e}")
+		return table
+	
+	# FUNC: saveIndex
+	# Writes the binary index, along with the shots findAllShots would match by default
+	# Quietly does without if the schema's directory can't be written to
+	def saveIndex(self):
+		table = self.schema_table
+		table.candidates = list(self._matchShots(self._patternMatcher(None, self.__class__.CAMERA_PATTERNS)))
+		table.candidates_hash = self.hashPatterns(self.__class__.CAMERA_PATTERNS)
+
+		try:
+			stat = self.path_schema.stat()
+			table.saveIndex(self.getIndexPath(), stat.st_size, stat.st_mtime_ns, hash_file(self.path_schema), table.candidates_hash, table.candidates)
+		except OSError as e:
+			if self.debug: print(f"Could not write schema index {self.getIndexPath()}: {e}")
 	
 	def getSchemaName(self):
 		return self.path_schema.stem
 	
-	# FUNC: walkSchema
-	# Prints a directory listing to std out.  Intended mainly for debugging purposes.
-	def walkSchema(self, current_node=None, path=pathlib.Path("/")):
-		
-		filelist = []
-
-		# TODO: Might need that "Skip over volume name" section up here to modify path
-		# I think I messed it up, I dunno.  Look in to it some time.
+	# FUNC: iterSchema
+	# Yields a FileRecord for every file under a directory (the whole tape by default), in schema order
+	# With sort=True, records are collected and sorted by startblock once at the end
+	def iterSchema(self, current_node=None, path=pathlib.Path("/"), sort=False):
 
-		# If no node was given, start at the root of the tape
-		if not current_node:
+		table = self.schema_table
+		if current_node is None:
 			if self.debug: print("Resetting node root")
 			current_node = self.schema_root
-		
-		# Get files in current directory
-		for file in current_node.findall("file"):
-			if self.debug: print(path, file.find("name").text)
-			try:
-				filename = file.find("name").text
-				filelist.append({
-					"path": path/filename,
-					"size": int(file.find("length").text),
-					"startblock": int(file.find("extentinfo/extent/startblock").text)
-				})
-			except Exception as e:
-				print(f"Omitting file {filename}: Incomplete file entry in schema ({e})")
-				continue
 
-			if self.debug: print(f"Added {filelist[-1].get('path')}")
+		if sort:
+			yield from sorted(self.iterSchema(current_node, path), key=operator.attrgetter("startblock"))
+			return
 
-		# Get list of subdirectories and recursively walk those files as well
-		for directory in current_node.findall("directory"):
-			dirname = directory.find("name").text
-			
-			if self.debug: print(path / dirname)
+		for file_index, dirpath in table.iterFiles(current_node):
 			
-			# Skip over volume name
-			if dirname == self.__class__.LTFS_BASE_DIR:
-				path = pathlib.Path('/')	# Start building pull path with the root directory (/)
-				
-			# Enter subdirectory if it isn't empty
-			subdir = directory.find("contents")
-			if subdir:
-				filelist.extend(self.walkSchema(subdir, path/dirname))
-			else:
-				if self.debug: print("Empty directory encountered; backing out.")
-	
-		# Sort file list by startblock
-		if len(filelist):
-			filelist = sorted(filelist, key=lambda x: x.get("startblock",0))
+			# Files without extent info can't be restored
+			if table.file_startblocks[file_index] < 0:
+				print(f"Omitting file {table.file_names[file_index]}: Incomplete file entry in schema (no extent info)")
+				continue
+
+			if self.debug: print(f"Added {dirpath}/{table.file_names[file_index]}")
+			yield FileRecord(table.file_names[file_index], table.file_sizes[file_index], table.file_startblocks[file_index], dirpath, path)
 
-		return filelist
+	# FUNC: walkSchema
+	# Lists every file under a directory (the whole tape by default), sorted by startblock
+	def walkSchema(self, current_node=None, path=pathlib.Path("/"), sort=True):
+		return list(self.iterSchema(current_node, path, sort=sort))
 	
-	def findAllShots(self, shot_name=None, tape_patterns=None, current_node=None, path=pathlib.Path(), file_extensions=(".ari",".r3d",".dpx",".dng",".cine",".braw", ".mov",".mxf",".mp4")):
-		
-		import re
+	def _pullFromDir(self, dir_index, shot_name):
+		"""CameraRawPull of an entire directory, or None if it has nothing to restore"""
 
-		shots = []
+		filelist = self.walkSchema(dir_index, pathlib.Path('.'))
+		if not filelist:
+			return None
+
+		shot = CameraRawPull(shot_name)
+		shot.setPath(basepath=pathlib.Path(self.schema_table.dirPath(dir_index)), type=CameraRawPull.Type.DIR, filelist=filelist, tape=Tape(self.getSchemaName()))
+		return shot
+
+	def _pullFromFile(self, file_index, dir_index, shot_name):
+		"""CameraRawPull of a single file"""
+
+		table = self.schema_table
+
+		# If file lacks startblock info, set it and its size to 0 just to avoid errors down the road
+		# I don't think a file would even be visible on LTFS without this info, but who knows
+		if table.file_startblocks[file_index] < 0:
+			if self.debug: print("Shot found in schema, but has missing extentinfo.  Restore may have difficulties.", shot_name, "warning")
+			startblock = bytecount = 0
+		else:
+			startblock = table.file_startblocks[file_index]
+			bytecount  = table.file_sizes[file_index]
 		
-		# If not explicit shot name is provided, use the tape patterns
+		shot = CameraRawPull(shot_name)
+		shot.setPath(basepath=pathlib.Path(table.dirPath(dir_index)), type=CameraRawPull.Type.FILE, filelist=[FileRecord(table.file_names[file_index], bytecount, startblock)], tape=Tape(self.getSchemaName()))
+		return shot
+
+	def _patternMatcher(self, shot_name, tape_patterns):
+		"""Function returning the shot name for a directory or file name, or None if it doesn't look like a shot"""
+
+		# If not explicit shot name is provided, use the tape patterns, all compiled into one regex
 		if shot_name is None:
-			templates_tape = tape_patterns or (
-				r"[a-z][0-9]{3}c[0-9]{3}_[0-9]{6}_[a-z][a-z0-9]{3}",	# ArriRAW
-				r"[a-z][0-9]{3}_[c,l,r][0-9]{3}_[0-9]{4}[a-z0-9]{2}",	# Redcode
-				r"[a-z][0-9]{3}[c,l,r][0-9]{3}_[0-9]{6}[a-z0-9]{2}",	# Sony Raw
-				r"[a-z][0-9]{3}_[0-9]{8}_C[0-9]{3}",					# Black Magic Cinema Camera
-				r"IMG_[0-9]+",											# iPhone/DSLR
-				r"DJI_[0-9]+",											# DJI Drones
-				r"MVI_[0-9]+",											# Consumer cameras
-				r"[A-Z]\d{3}G[A-Z]\d{3,}",								# GoPro Footage (Nobody)
-				r"[A-Z]\d{3}_P\d{3,}",									# Panasonic Lumix (Nobody)
-				r"LR\d{8}",												# Fast 9 35mm
-				r"CA35_\d{3}",											# Fast 9 35mm
-				r"D[A-Z]\d{3}_S\d{3}_S\d{3}_T\d{3}",					# Fast 9 Drone
-				r"[A-Z]\d{3}_DPX"										# Fast 9 Crash Cam
-			)
-			patterns_tape = {re.compile(pat, re.I) for pat in templates_tape}
-
-		if not isinstance(path, pathlib.Path):
-			try: path = pathlib.Path(path)
-			except Exception as e: raise Exception(f"Invalid LTO search path: {e}")
-
-		if not current_node: current_node = self.schema_root
-		
-		# Get all subdirectories
-		nodes = current_node.findall("directory")
-		
-		# Loop through each directory
-		for node in nodes:
-			
-			
-			dirname = node.find("name").text
-			
-	
-			# Skip over volume name
-			if dirname == self.__class__.LTFS_BASE_DIR:
-				path = pathlib.Path('/')	# Start building pull path with the root directory (/)
-			
-			match = False
-			
-			# If this directory's name matches tape name, assume it's an image sequence and restore the full directory
+			pattern_tape = self.compilePatterns(tuple(tape_patterns))
+
+		def matchName(name, is_file):
 			if shot_name is not None:
-				match = dirname.lower().startswith(shot_name.lower())
-				match_name = dirname
-			else:
-				for pat in patterns_tape:
-					match = pat.match(dirname)
-					if match:
-						match_name = match.group(0)
-						break
-
-			# If pattern matched directory name
-			if match:
-			
-				# Gather file listing
-				filelist = self.walkSchema(node.find("contents"), pathlib.Path('.'))
-				#print(filelist)
+				if name.lower().startswith(shot_name.lower()):
+					return name.rsplit('.',1)[0] if is_file else name
+				return None
+			match = pattern_tape.match(name)
+			return match.group(0) if match else None
+		
+		return matchName
 
-				# Walk file tree to get stats
-				#print(f"Found {len(filelist)} files in {pathlib.Path(path, dirname)}: {[x.get('size') for x in filelist]}")
-				#size = sum([x.get("size") for x in filelist])
-				
-				try: startblock = min([x.get("startblock") for x in filelist])
-				except Exception as e:
-					print(f"Freaked the fuck out at {pathlib.Path(path,dirname)}")
-					print(f"Found files:")
-					print(filelist)
-					exit()
-				
-				
-				shot = CameraRawPull(match_name)
-				shot.setPath(basepath=pathlib.Path(path, dirname), type=CameraRawPull.Type.DIR, filelist=filelist, tape=Tape(self.getSchemaName()))
-				
-				shots.append(shot)
+	def _matchShots(self, matchName):
+		"""Yield (CameraRawPull.Type, directory or file index, directory index, shot name) for everything named like a shot"""
+
+		table = self.schema_table
+
+		# Walk every directory below the volume, skipping over the contents of matched directories
+		pending = list(reversed(table.dirChildren(self.schema_root)))
+		while pending:
+			dir_index = pending.pop()
+			
+			# If this directory's name matches tape name, assume it's an image sequence and restore the full directory
+			match_name = matchName(table.dir_names[dir_index], False)
+			if match_name:
+				yield (CameraRawPull.Type.DIR, dir_index, dir_index, match_name)
 				continue
 			
 			# Otherwise, loop through each file in directory
-			for file in node.findall("contents/file"):
-				filestring = file.find("name").text
-				
-				if shot_name is not None:
-					match = filestring.lower().startswith(shot_name.lower())
-					match_name = filestring.rsplit('.',1)[0]
-				else:
-					for pat in patterns_tape:
-						match = pat.match(filestring)
-						if match:
-							match_name = match.group(0)
-							break
-					
-
-				if match and filestring.lower().endswith(file_extensions):
-				
-					try:
-						startblock = int(file.find("extentinfo/extent/startblock").text)
-						bytecount  = int(file.find("length").text)
-					except:
-						# If file lacks startblock or bytecount info, set it to 0 just to avoid errors down the road
-						# I don't think a file would even be visible on LTFS without this info, but who knows 
-						if self.debug: print("Shot found in schema, but has missing extentinfo.  Restore may have difficulties.", shot.shot, "warning")
-						startblock = 0
-						bytecount = 0
-					
-					shot = CameraRawPull(match_name)
-					shot.setPath(basepath=pathlib.Path(path,dirname), type=CameraRawPull.Type.FILE, filelist=[{"path": pathlib.Path(filestring) ,"size": int(bytecount), "startblock": startblock}], tape=Tape(self.getSchemaName()))
-					shots.append(shot)
-			
-			# Search subdirectories.  If it's found in there, break out of the loop to return the result
-			dircontents = node.find("contents")
-			if dircontents:
-				shots.extend(self.findAllShots(shot_name=shot_name, current_node=dircontents, tape_patterns=tape_patterns, path=path/dirname))
+			for file_index in table.dirFiles(dir_index):
+				match_name = matchName(table.file_names[file_index], True)
+				if match_name:
+					yield (CameraRawPull.Type.FILE, file_index, dir_index, match_name)
 			
-			# Break out after first match
-			# Commented out so we can find a larger filesize later on in the schema
-			# if result: break
+			# Then search subdirectories
+			pending.extend(reversed(table.dirChildren(dir_index)))
+
+	def findAllShots(self, shot_name=None, tape_patterns=None, file_extensions=(".ari",".r3d",".dpx",".dng",".cine",".braw", ".mov",".mxf",".mp4")):
+		
+		shots = []
+		table = self.schema_table
+		table.loadNames()
+		tape_patterns = tape_patterns or self.__class__.CAMERA_PATTERNS
+
+		# Shots matched with these same patterns may already be in the index
+		if shot_name is None and table.candidates is not None and table.candidates_hash == self.hashPatterns(tape_patterns):
+			matches = table.candidates
+		else:
+			matches = self._matchShots(self._patternMatcher(shot_name, tape_patterns))
+
+		for match_type, index, dir_index, match_name in matches:
+			if match_type == CameraRawPull.Type.DIR:
+				shot = self._pullFromDir(index, match_name)
+				if shot: shots.append(shot)
+			elif table.file_names[index].lower().endswith(file_extensions):
+				shots.append(self._pullFromFile(index, dir_index, match_name))
 
 		return shots
 
+	# FUNC: buildIndex
+	# Indexes directory names and file stems once, so any number of shots can be looked up without walking the schema again
+	def buildIndex(self):
+
+		table = self.schema_table
+		table.loadNames()
+		count_dirs = len(table.dir_names)
+
+		# Directory names, sorted lowercase for prefix lookups
+		names = sorted((name.lower(), idx) for idx, name in enumerate(table.dir_names) if idx != self.schema_root)
+		self.index_dir_names = [name for name, idx in names]
+		self.index_dir_ids   = array.array('q', (idx for name, idx in names))
+
+		# File stems, and which directory each file lives in
+		self.index_file_dirs = array.array('q', bytes(8 * len(table.file_names)))
+		self.index_stems = {}
+		for dir_index in range(count_dirs):
+			for file_index in table.dirFiles(dir_index):
+				self.index_file_dirs[file_index] = dir_index
+				self.index_stems.setdefault(file_stem(table.file_names[file_index]).lower(), []).append(file_index)
+
+		# Restorable size and first startblock of everything under each directory
+		# Children always have higher indices than their parents, so one pass in reverse adds everything up
+		self.index_dir_sizes = array.array('q', bytes(8 * count_dirs))
+		self.index_dir_startblocks = array.array('q', [-1]) * count_dirs
+		for dir_index in reversed(range(count_dirs)):
+			size, startblock = self.index_dir_sizes[dir_index], self.index_dir_startblocks[dir_index]
+			for file_index in table.dirFiles(dir_index):
+				if table.file_startblocks[file_index] < 0: continue
+				size += table.file_sizes[file_index]
+				if startblock < 0 or table.file_startblocks[file_index] < startblock:
+					startblock = table.file_startblocks[file_index]
+			self.index_dir_sizes[dir_index], self.index_dir_startblocks[dir_index] = size, startblock
+
+			parent = table.dir_parents[dir_index]
+			if parent >= 0:
+				self.index_dir_sizes[parent] += size
+				if startblock >= 0 and (self.index_dir_startblocks[parent] < 0 or startblock < self.index_dir_startblocks[parent]):
+					self.index_dir_startblocks[parent] = startblock
+		
+		self._indexed = True
+	
+	def _isShadowed(self, dir_index, shot_name):
+		"""Whether a directory or one of its parents already matches a shot name, and would be pulled whole instead"""
+		
+		table = self.schema_table
+		while dir_index > self.schema_root:
+			if table.dir_names[dir_index].lower().startswith(shot_name):
+				return True
+			dir_index = table.dir_parents[dir_index]
+		return False
+
+	def _findCandidates(self, shot_name, file_extensions):
+		"""Yield (size, order, kind, index) for every directory or file that would be pulled for a shot name"""
+
+		table = self.schema_table
+
+		# Directories whose names start with the shot name, unless a parent directory already matches
+		start = bisect.bisect_left(self.index_dir_names, shot_name)
+		for pos in range(start, len(self.index_dir_names)):
+			if not self.index_dir_names[pos].startswith(shot_name): break
+			dir_index = self.index_dir_ids[pos]
+			if self.index_dir_startblocks[dir_index] < 0: continue
+			if self._isShadowed(table.dir_parents[dir_index], shot_name): continue
+			yield (self.index_dir_sizes[dir_index], (dir_index, -1), CameraRawPull.Type.DIR, dir_index)
+
+		# Files named exactly for the shot, with an acceptable extension, outside of any matching directory
+		for file_index in self.index_stems.get(shot_name, []):
+			if not pathlib.Path(table.file_names[file_index]).suffix.lower() in file_extensions: continue
+			dir_index = self.index_file_dirs[file_index]
+			if dir_index == self.schema_root or self._isShadowed(dir_index, shot_name): continue
+			size = table.file_sizes[file_index] if table.file_startblocks[file_index] >= 0 else 0
+			yield (size, (dir_index, file_index), CameraRawPull.Type.FILE, file_index)
+
 	# UPDATE: Once shot is found, the active schema will continue to be searched for more matches with larger file sizes.  Largest will be returned.
 	# With shows like "You Should Have Left," I've been seeing DNX115 MXFs found before camera raw MXFs, and this is the best fix I can think of.
 	# Better could be to add support for Yoyotta xattrib tags (com.yoyotta.ch.codec), but that wouldn't be a universal solution.
-	def findShot(self, shot, current_node=None, path=pathlib.Path(), file_extensions=(".ari",".r3d",".dpx",".dng",".cine",".braw",".mov",".mxf"), bestmatch=None):
-		
-		if not isinstance(path, pathlib.Path):
-			try: path = pathlib.Path(path)
-			except Exception as e: raise Exception(f"Invalid LTO search path: {e}")
+	def findShot(self, shot, file_extensions=(".ari",".r3d",".dpx",".dng",".cine",".braw",".mov",".mxf")):
+		return self.findShots([shot], file_extensions)[0]
+	
+	# FUNC: findShots
+	# Looks up a batch of shots against the index (built on first use); largest match wins, as with findShot
+	# Returns a list the same length as shots, with the found shot or None in each position
+	def findShots(self, shots, file_extensions=(".ari",".r3d",".dpx",".dng",".cine",".braw",".mov",".mxf")):
 
-		if not current_node: current_node = self.schema_root
-		
-		# Get all subdirectories
-		nodes = current_node.findall("directory")
-		
-		# Loop through each directory
-		for node in nodes:
-			dirname = node.find("name").text
-			
-			if self.debug: print("Lookin' at {}".format(dirname))
-			# Skip over volume name
-			if dirname == self.__class__.LTFS_BASE_DIR:
-				path = pathlib.Path('/')	# Start building pull path with the root directory (/)
-			
-			# If this directory's name matches tape name, assume it's an image sequence and restore the full directory
-			if dirname.lower().startswith(shot.shot.lower()):
-				
-				# Gather file listing
-				filelist = self.walkSchema(node.find("contents"), pathlib.Path('.'))
-				#print(filelist)
-
-				# Walk file tree to get stats
-				#print(f"Found {len(filelist)} files in {pathlib.Path(path, dirname)}: {[x.get('size') for x in filelist]}")
-				size = sum([x.get("size") for x in filelist])
-				startblock = min([x.get("startblock") for x in filelist])
-				
-				# If we have a previous match, and the previous match has a larger filesize, stick with it
-				if bestmatch is not None and bestmatch.getSize() > size:
-					return bestmatch
-								
-				shot.setPath(basepath=pathlib.Path(path, dirname), type=CameraRawPull.Type.DIR, filelist=filelist, tape=Tape(self.getSchemaName()))
-				return shot
-			
-			# Otherwise, loop through each file in directory
-			for file in node.findall("contents/file"):
+		if not getattr(self, "_indexed", False):
+			self.buildIndex()
 
-				try:
-					filename = pathlib.Path(file.find("name").text)
-				except Exception as e:
-					raise Exception(f"Error parsing filename on LTO: {e}")
-
-				# If filename is a match and has acceptable file extension
-				if filename.stem.lower() == shot.shot.lower() and filename.suffix.lower() in file_extensions:
-					try:
-						startblock = int(file.find("extentinfo/extent/startblock").text)
-						bytecount  = int(file.find("length").text)
-					except:
-						# If file lacks startblock or bytecount info, set it to 0 just to avoid errors down the road
-						# I don't think a file would even be visible on LTFS without this info, but who knows 
-						if self.debug: print("Shot found in schema, but has missing extentinfo.  Restore may have difficulties.", shot.shot, "warning")
-						startblock = 0
-						bytecount = 0
-						
-					# If a previous match has a larger filesize, stick with the larger one
-					if bestmatch is not None and bestmatch.getSize() > int(bytecount):
-						return bestmatch
-
-					shot.setPath(basepath=pathlib.Path(path,dirname), type=CameraRawPull.Type.FILE, filelist=[{"path": pathlib.Path(filename) ,"size": int(bytecount), "startblock": startblock}], tape=Tape(self.getSchemaName()))
-					return shot
+		file_extensions = tuple(ext.lower() for ext in file_extensions)
+		results = []
+
+		for shot in shots:
 			
-			# Search subdirectories.  If it's found in there, break out of the loop to return the result
-			dircontents = node.find("contents")
-			if dircontents:
-				bestmatch = self.findShot(shot, dircontents, path/dirname, bestmatch=bestmatch)
+			# Ties go to the match found last in the schema
+			best = max(self._findCandidates(shot.shot.lower(), file_extensions), default=None, key=lambda x: (x[0], x[1]))
+			if best is None:
+				results.append(None)
+				continue
+
+			size, order, match_type, index = best
+			if match_type == CameraRawPull.Type.DIR:
+				match = self._pullFromDir(index, shot.shot)
+			else:
+				match = self._pullFromFile(index, self.index_file_dirs[index], shot.shot)
 			
-			# Break out after first match
-			# Commented out so we can find a larger filesize later on in the schema
-			# if result: break
+			shot.setPath(basepath=match.basepath, type=match.type, filelist=match.filelist, tape=match.tape)
+			results.append(shot)
+
+		return results
+
+# Cataloguing helpers =========================================
+# Module-level so they can be sent off to worker processes
 
-		return bestmatch
+def catalog_shots(schema):
+	"""Every shot findAllShots finds in a schema, as (name, size, base path, [(rel_path, startblock, size)]) rows"""
+	return [(shot.shot, shot.getSize(), str(shot.basepath), [(str(file.get("path")), file.get("startblock"), file.get("size")) for file in shot.filelist]) for shot in schema.findAllShots()]
+
+def hash_file(path_file, chunk_size=1024*1024):
+	"""SHA-1 of a file's contents"""
+	digest = hashlib.sha1()
+	with open(path_file, "rb") as file_input:
+		for chunk in iter(lambda: file_input.read(chunk_size), b''):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+def catalog_schema_file(path_schema, known_hash=None):
+	"""
+	Parse a .schema file and catalog its shots, for ShotDB.catalogLibrary
+
+	Arguments:
+		path_schema {str|pathlib.Path} -- Path to .schema file
+
+	Keyword Arguments:
+		known_hash {str} -- Hash from the last time this schema was catalogued.  If it still matches, parsing is skipped. (default: {None})
+
+	Returns:
+		dict -- "path", "size", "mtime_ns", "hash" and "tape" of the schema, and its "shots" (None if unchanged)
+	"""
+
+	path_schema = pathlib.Path(path_schema)
+	stat = path_schema.stat()
+	info = {"path": path_schema, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hash": hash_file(path_schema), "tape": path_schema.stem, "shots": None}
+
+	if info.get("hash") != known_hash:
+		info["shots"] = catalog_shots(Schema(path_schema))
+	return info
+
+def edit_distance(a, b, max_distance=None):
+	"""Levenshtein distance between two strings, giving up early once it's known to be over max_distance"""
+
+	if len(a) < len(b):
+		a, b = b, a
+	if max_distance is not None and len(a) - len(b) > max_distance:
+		return max_distance + 1
+	
+	previous = list(range(len(b) + 1))
+	for idx_a, char_a in enumerate(a, 1):
+		current = [idx_a]
+		for idx_b, char_b in enumerate(b, 1):
+			current.append(min(previous[idx_b] + 1, current[idx_b - 1] + 1, previous[idx_b - 1] + (char_a != char_b)))
+		if max_distance is not None and min(current) > max_distance:
+			return max_distance + 1
+		previous = current
+	return previous[-1]
 
 # CLASS: ShotsDB =============================================================
 # sqlite3 database containing shots per LTO per show
@@ -577,6 +1456,20 @@ class Schema:
 
 class ShotDB:
 
+	class SearchMode(enum.Enum):
+		PREFIX, SUBSTRING, FUZZY = range(3)
+
+	# Indexes are dropped during bulk ingest and built again afterwards
+	SQL_INDEXES = [
+		("idx_shots",        "CREATE INDEX IF NOT EXISTS idx_shots on shots(name);"),
+		("idx_shots_unique", "CREATE INDEX IF NOT EXISTS idx_shots_unique on shots(name,size);"),
+		("idx_shots_tape",   "CREATE INDEX IF NOT EXISTS idx_shots_tape on shots(guid_tape);"),
+		("idx_files",        "CREATE INDEX IF NOT EXISTS idx_files on files(guid_shot);")
+	]
+
+	# ...but only when the batch is at least this big next to what's already there, since rebuilding means re-sorting every row
+	DEFER_INDEXES_RATIO = 0.25
+
 	def __init__(self, path_db):
 		
 		# Validate path
@@ -590,6 +1483,7 @@ class ShotDB:
 		try:
 			self.db_con = sqlite3.connect(pathlib.Path(self.path_db))
 			self.db_cur = self.db_con.cursor()
+			self.db_cur.execute("PRAGMA journal_mode=WAL")
 		except Exception as e:
 			raise Exception(f"Error loading database at {self.path_db}: {e}")
 
@@ -604,7 +1498,8 @@ class ShotDB:
 		except Exception as e:
 			raise Exception(f"Error parsing database at {self.path_db}: {e}")
 
-		if all([table in tables for table in ["tapes","shots","files"]]):
+		if all([table in tables for table in ["tapes","shots","files","schemas"]]):
+			self.db_setup_search()
 			return
 
 		sql_create = [
@@ -629,52 +1524,341 @@ class ShotDB:
 				startblock INTEGER DEFAULT 0 NOT NULL,
 				size INTEGER DEFAULT 0 NOT NULL
 			);""",
+
+			"""CREATE TABLE IF NOT EXISTS schemas (
+				path TEXT PRIMARY KEY,
+				size INTEGER NOT NULL,
+				mtime_ns INTEGER NOT NULL,
+				hash TEXT NOT NULL,
+				tape_name TEXT NOT NULL
+			);"""] + [sql for name, sql in self.__class__.SQL_INDEXES]
+
+		{self.db_cur.execute(sql_statement) for sql_statement in sql_create}
+		self.db_setup_search()
+
+	def db_setup_search(self):
+		"""Set up the trigram index over shot names and base paths, if this sqlite has FTS5 and its trigram tokenizer"""
+
+		self.has_search = False
+		try:
+			tables = [table[0] for table in self.db_cur.execute("SELECT name from sqlite_master").fetchall()]
+			if "shots_fts" not in tables:
+				self.db_cur.execute("CREATE VIRTUAL TABLE shots_fts USING fts5(name, base_path, content='shots', content_rowid='guid_shot', tokenize='trigram')")
+				self.db_cur.execute("INSERT INTO shots_fts(shots_fts) VALUES ('rebuild')")
 			
-			"""CREATE INDEX IF NOT EXISTS idx_shots on shots(name);""",
+			# Keep the index in step with the shots table
+			{self.db_cur.execute(sql_statement) for sql_statement in [
+				"""CREATE TRIGGER IF NOT EXISTS shots_fts_insert AFTER INSERT ON shots BEGIN
+					INSERT INTO shots_fts(rowid, name, base_path) VALUES (new.guid_shot, new.name, new.base_path);
+				END;""",
+				"""CREATE TRIGGER IF NOT EXISTS shots_fts_delete AFTER DELETE ON shots BEGIN
+					INSERT INTO shots_fts(shots_fts, rowid, name, base_path) VALUES ('delete', old.guid_shot, old.name, old.base_path);
+				END;""",
+				"""CREATE TRIGGER IF NOT EXISTS shots_fts_update AFTER UPDATE OF name, base_path ON shots BEGIN
+					INSERT INTO shots_fts(shots_fts, rowid, name, base_path) VALUES ('delete', old.guid_shot, old.name, old.base_path);
+					INSERT INTO shots_fts(rowid, name, base_path) VALUES (new.guid_shot, new.name, new.base_path);
+				END;"""]}
+			self.db_con.commit()
+			self.has_search = True
+		
+		# Older sqlite builds: searchShots falls back to scanning with LIKE
+		except sqlite3.OperationalError:
+			self.db_con.rollback()
+
+	def searchShots(self, query, mode=None, limit=50, max_distance=None):
+		"""
+		Search for shots by partial or approximate name
+
+		Uses the trigram index where available, which handles queries of three characters or more;
+		anything else falls back to a LIKE scan.  Fuzzy search gathers candidates containing pieces
+		of the query, then ranks them by edit distance to the query.
+
+		Arguments:
+			query {str} -- Shot name, or part of one
 
-			"""CREATE INDEX IF NOT EXISTS idx_shots_unique on shots(name,size);""",
+		Keyword Arguments:
+			mode {ShotDB.SearchMode} -- PREFIX of shot names, SUBSTRING of shot names or base paths, or FUZZY match of shot names (default: {SearchMode.PREFIX})
+			limit {int} -- Maximum number of results (default: {50})
+			max_distance {int} -- For FUZZY, leave out shots more than this many edits away (default: {None})
+
+		Returns:
+			list -- Dicts of "name", "size", "base_path", "tape" and "distance" per shot, best match first
+		"""
+
+		mode = mode or self.__class__.SearchMode.PREFIX
+		query_lower = query.lower()
+		use_index = self.has_search and len(query) >= 3
+
+		# Too short to be approximately anything; take the names it starts instead
+		if mode == self.__class__.SearchMode.FUZZY and len(query) < 3:
+			mode = self.__class__.SearchMode.PREFIX
+		sql_select = "SELECT shots.name, shots.size, shots.base_path, tapes.name FROM shots INNER JOIN tapes ON tapes.guid_tape = shots.guid_tape"
+		like = query_lower.replace("\\","\\\\").replace("%","\\%").replace("_","\\_")
+
+		def fts_phrase(text):
+			return '"{}"'.format(text.replace('"','""'))
+
+		if mode == self.__class__.SearchMode.PREFIX:
+			if use_index:
+				rows = self.db_cur.execute(f"{sql_select} INNER JOIN shots_fts ON shots_fts.rowid = shots.guid_shot WHERE shots_fts MATCH ? AND LOWER(shots.name) LIKE ? ESCAPE '\\' ORDER BY shots.name, shots.size DESC LIMIT ?", ("name : " + fts_phrase(query), like + "%", limit))
+			else:
+				rows = self.db_cur.execute(f"{sql_select} WHERE LOWER(shots.name) LIKE ? ESCAPE '\\' ORDER BY shots.name, shots.size DESC LIMIT ?", (like + "%", limit))
+			return [{"name": name, "size": size, "base_path": base_path, "tape": tape, "distance": len(name) - len(query)} for name, size, base_path, tape in rows.fetchall()]
+		
+		elif mode == self.__class__.SearchMode.SUBSTRING:
+			if use_index:
+				rows = self.db_cur.execute(f"{sql_select} INNER JOIN shots_fts ON shots_fts.rowid = shots.guid_shot WHERE shots_fts MATCH ? ORDER BY shots_fts.rank LIMIT ?", (fts_phrase(query), limit))
+			else:
+				rows = self.db_cur.execute(f"{sql_select} WHERE LOWER(shots.name) LIKE ? ESCAPE '\\' OR LOWER(shots.base_path) LIKE ? ESCAPE '\\' LIMIT ?", ("%" + like + "%", "%" + like + "%", limit))
+			return [{"name": name, "size": size, "base_path": base_path, "tape": tape, "distance": None} for name, size, base_path, tape in rows.fetchall()]
+		
+		elif mode == self.__class__.SearchMode.FUZZY:
+
+			# Split the query into pieces: a name within (pieces - 1) edits of it must contain at least one of them intact
+			# Candidates are ranked by how many pieces they contain, and only the best few are measured exactly
+			if use_index:
+				count_pieces = max(1, min(len(query) // 3, (max_distance if max_distance is not None else len(query) // 6) + 1))
+				bounds = [round(idx * len(query) / count_pieces) for idx in range(count_pieces + 1)]
+				pieces = {query_lower[start:end] for start, end in zip(bounds, bounds[1:])}
+				sql_pieces = " UNION ALL ".join(["SELECT rowid FROM shots_fts WHERE shots_fts MATCH ?"] * len(pieces))
+				rows = self.db_cur.execute(f"{sql_select} INNER JOIN (SELECT rowid, COUNT(*) AS hits FROM ({sql_pieces}) GROUP BY rowid ORDER BY hits DESC LIMIT ?) candidates ON candidates.rowid = shots.guid_shot", tuple("name : " + fts_phrase(piece) for piece in pieces) + (max(limit * 10, 200),))
+			else:
+				rows = self.db_cur.execute(sql_select)
 			
-			"""CREATE INDEX IF NOT EXISTS idx_files on files(guid_shot);"""]
+			results = []
+			for name, size, base_path, tape in rows.fetchall():
+				distance = edit_distance(query_lower, name.lower(), max_distance)
+				if max_distance is None or distance <= max_distance:
+					results.append({"name": name, "size": size, "base_path": base_path, "tape": tape, "distance": distance})
+			return sorted(results, key=lambda x: (x.get("distance"), x.get("name"), -x.get("size")))[:limit]
+		
+		else:
+			raise ValueError(f"Invalid search mode: {mode}")
 
-		{self.db_cur.execute(sql_statement) for sql_statement in sql_create}
 
+	def ingestSchema(self, schema, density=6):
+		"""Catalog every shot found on a tape.  See ingestSchemas."""
+		return self.ingestSchemas([schema], density)
 
-	def findShot(self, shot, ignoreproxies=True):
+	def ingestSchemas(self, schemas, density=6):
+		"""
+		Catalog every shot found on a batch of tapes, in one transaction.
 
-		results = []
-		db_shot_found = self.db_cur.execute("SELECT shots.name, shots.size, shots.guid_shot, shots.guid_tape, tapes.name, tapes.density, shots.base_path FROM shots INNER JOIN tapes ON tapes.guid_tape = shots.guid_tape WHERE shots.name=? ORDER BY shots.size DESC",(shot,))
+		Shots are found with Schema.findAllShots and written with executemany.  If the database is empty, or the
+		batch is large next to what's already in it, the indexes are dropped for the duration and built again at
+		the end; otherwise rows go in with the indexes updated as they are.  A tape which is already in the database
+		has its shots and files replaced, so ingesting the same tape again leaves the catalog unchanged.
+
+		Arguments:
+			schemas {list} -- Schema objects, or paths to .schema files
+
+		Keyword Arguments:
+			density {int|Tape.Density} -- LTO generation of the tapes (default: {6})
+
+		Returns:
+			int -- Number of shots written
+		"""
+
+		tapes = []
+		for schema in schemas:
+			if not isinstance(schema, Schema):
+				schema = Schema(schema)
+			tapes.append((schema.getSchemaName(), catalog_shots(schema)))
+		
+		return self._writeTapes(tapes, density)
+
+	def catalogLibrary(self, schemas, max_workers=None, batch_size=32, density=6, force=False, errors=None):
+		"""
+		Catalog a library of .schema files, parsing them in a pool of processes.
+
+		This ShotDB stays the only writer: results are funneled back from the workers and written in batched
+		transactions.  Schemas are skipped if their size and mtime are unchanged since they were last catalogued,
+		or if they were touched but their contents hash the same.
+
+		Arguments:
+			schemas {str|pathlib.Path|list} -- Directory to search for .schema files, or a list of .schema paths
 
-		# For each shot found, create Shot object and add to results[] list
-		for shot_name, shot_size, shot_guid, shot_tape_guid, shot_tape_name, shot_tape_density, shot_basepath in db_shot_found.fetchall():
+		Keyword Arguments:
+			max_workers {int} -- Number of parsing processes (default: {CPU count})
+			batch_size {int} -- Number of schemas written per transaction (default: {32})
+			density {int|Tape.Density} -- LTO generation of the tapes (default: {6})
+			force {bool} -- Catalog every schema, changed or not (default: {False})
+			errors {dict} -- If given, schemas which could not be catalogued are recorded here as {path: exception} (default: {None})
+
+		Returns:
+			dict -- Number of schemas "catalogued", "unchanged" and "failed"
+		"""
+
+		if isinstance(schemas, (str, pathlib.Path)):
+			schemas = sorted(pathlib.Path(schemas).rglob("*.schema"))
+		errors = errors if errors is not None else {}
+		counts = {"catalogued": 0, "unchanged": 0, "failed": 0}
+
+		known = {path: (size, mtime_ns, hash) for path, size, mtime_ns, hash in self.db_cur.execute("SELECT path, size, mtime_ns, hash FROM schemas")}
+		
+		# Quick check on size and mtime before anything gets hashed
+		pending = []
+		for path_schema in schemas:
+			path_schema = pathlib.Path(path_schema).resolve()
+			stat = path_schema.stat()
+			info = known.get(str(path_schema))
+			if not force and info and info[:2] == (stat.st_size, stat.st_mtime_ns):
+				counts["unchanged"] += 1
+			else:
+				pending.append((path_schema, None if force or not info else info[2]))
+
+		with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as pool:
+			futures = {pool.submit(catalog_schema_file, path_schema, known_hash): path_schema for path_schema, known_hash in pending}
+			tapes, touched = [], []
 			
-			db_files = self.db_cur.execute("SELECT rel_path, startblock, size FROM files WHERE guid_shot = ? ORDER BY startblock ASC",(shot_guid,))
-			files = []
-			for rel_path, startblock, filesize in db_files.fetchall():
-				files.append({"path":pathlib.Path(rel_path), "startblock":startblock, "size": filesize})
+			for future in concurrent.futures.as_completed(futures):
+				try:
+					result = future.result()
+				except Exception as e:
+					errors[futures[future]] = e
+					counts["failed"] += 1
+					continue
+
+				if result.get("shots") is None:
+					touched.append(result)
+					counts["unchanged"] += 1
+				else:
+					tapes.append((result.get("tape"), result.get("shots"), result))
+					counts["catalogued"] += 1
+				
+				if len(tapes) >= batch_size:
+					self._writeTapes(tapes, density, schemas=touched)
+					tapes, touched = [], []
 			
-			if not len(files):
-#				sys.stderr.write(f"No files found for shot {shot_name}\n")
-				continue
+			if tapes or touched:
+				self._writeTapes(tapes, density, schemas=touched)
+		
+		return counts
 
-			shot_found = CameraRawPull(shot_name)
-			shot_found.setPath(size=shot_size, basepath=pathlib.Path(shot_basepath), tape=Tape(shot_tape_name, density=shot_tape_density), filelist=files)
-			results.append(shot_found)
+	def _writeTapes(self, tapes, density=6, defer_indexes=None, schemas=None):
+		"""
+		Write catalogued tapes in a single transaction, replacing any earlier versions of them
 
-		results = sorted(results, reverse=True, key=lambda x: x.getSize())
+		Arguments:
+			tapes {list} -- (tape name, shots from catalog_shots) or (tape name, shots, schema info from catalog_schema_file) per tape
 
-		# Remove paths that look like they could be proxies
-		if ignoreproxies:
-			for result in results:
+		Keyword Arguments:
+			density {int|Tape.Density} -- LTO generation of the tapes (default: {6})
+			defer_indexes {bool} -- Drop the indexes while inserting and build them again afterwards, or None to decide from the size of the batch (default: {None})
+			schemas {list} -- Schema info to record for schemas whose shots haven't changed (default: {None})
+
+		Returns:
+			int -- Number of shots written
+		"""
+
+		density = Tape.Density(density).value
+		count_shots = 0
+
+		self.db_con.commit()
+		self.db_cur.execute("BEGIN")
+		try:
+			
+			# Clear out earlier versions of these tapes while the indexes are still around
+			guids_tape = []
+			for tape_name, *_ in tapes:
+				self.db_cur.execute("DELETE FROM files WHERE guid_shot IN (SELECT guid_shot FROM shots WHERE guid_tape = (SELECT guid_tape FROM tapes WHERE name=?))", (tape_name,))
+				self.db_cur.execute("DELETE FROM shots WHERE guid_tape = (SELECT guid_tape FROM tapes WHERE name=?)", (tape_name,))
+				self.db_cur.execute("INSERT OR IGNORE INTO tapes (name, density) VALUES (?,?)", (tape_name, density))
+				self.db_cur.execute("UPDATE tapes SET density=? WHERE name=?", (density, tape_name))
+				guids_tape.append(self.db_cur.execute("SELECT guid_tape FROM tapes WHERE name=?", (tape_name,)).fetchone()[0])
+			
+			# Rebuilding the indexes only pays off when the batch is big next to the tables it's going into
+			if defer_indexes is None:
+				count_rows = sum(1 + len(files) for tape_name, shots, *_ in tapes for *_, files in shots)
+				count_existing = self.db_cur.execute("SELECT (SELECT COALESCE(MAX(rowid),0) FROM shots) + (SELECT COALESCE(MAX(rowid),0) FROM files)").fetchone()[0]
+				defer_indexes = count_rows >= count_existing * self.__class__.DEFER_INDEXES_RATIO
+			
+			if defer_indexes:
+				{self.db_cur.execute(f"DROP INDEX IF EXISTS {name}") for name, sql in self.__class__.SQL_INDEXES}
+
+			# Shot IDs are handed out here, so files can be inserted alongside their shots without looking anything up
+			guid_shot = self.db_cur.execute("SELECT COALESCE(MAX(guid_shot),0) FROM shots").fetchone()[0]
+
+			for (tape_name, shots, *info), guid_tape in zip(tapes, guids_tape):
+				rows_shots, rows_files = [], []
+				for shot_name, shot_size, shot_basepath, files in shots:
+					guid_shot += 1
+					rows_shots.append((guid_shot, guid_tape, shot_name, shot_size, shot_basepath))
+					rows_files.extend((guid_shot,) + file for file in files)
 				
-				# remove proxy from results lit
-				if any(x in str(result.basepath).lower() for x in ("dnx","conv","editorial")):
-						
-						# Is a proxy better than nothing?
-						if len(results) < 2:
-#							sys.stderr.write(f"Shot {result.shot} appears to be proxy only!\n")
-							break
-
-						#sys.stderr.write(f"Ignoring proxy for {shot}\n")
-						del results[results.index(result)]
-		
-		return results[0] if len(results) else None
\ No newline at end of file
+				self.db_cur.executemany("INSERT INTO shots (guid_shot, guid_tape, name, size, base_path) VALUES (?,?,?,?,?)", rows_shots)
+				self.db_cur.executemany("INSERT INTO files (guid_shot, rel_path, startblock, size) VALUES (?,?,?,?)", rows_files)
+				count_shots += len(rows_shots)
+
+			# Remember which schema files these came from, so unchanged ones can be skipped next time
+			self.db_cur.executemany("INSERT OR REPLACE INTO schemas (path, size, mtime_ns, hash, tape_name) VALUES (?,?,?,?,?)",
+				[(str(info.get("path")), info.get("size"), info.get("mtime_ns"), info.get("hash"), info.get("tape")) for info in (schemas or []) + [info[0] for tape_name, shots, *info in tapes if info]])
+
+			if defer_indexes:
+				{self.db_cur.execute(sql) for name, sql in self.__class__.SQL_INDEXES}
+			self.db_con.commit()
+
+		except Exception as e:
+			self.db_con.rollback()
+			raise Exception(f"Error writing tapes to {self.path_db}: {e}")
+		
+		return count_shots
+
+	# Base paths that look like they could be proxies
+	PROXY_PATTERNS = ("dnx","conv","editorial")
+
+	def findShot(self, shot, ignoreproxies=True):
+		results = self.findShots([shot], ignoreproxies).get(shot)
+		return results[0] if results else None
+
+	def findShots(self, shots, ignoreproxies=True):
+		"""
+		Look up a batch of shot names in a handful of set-based queries
+
+		Arguments:
+			shots {list} -- Shot names to look up
+
+		Keyword Arguments:
+			ignoreproxies {bool} -- Leave out shots whose paths look like proxies, unless proxies are all there is (default: {True})
+
+		Returns:
+			dict -- For each name, a list of CameraRawPulls found for it, largest first
+		"""
+
+		results = {shot: [] for shot in shots}
+
+		# Stage names in a temp table so everything can be done with joins
+		self.db_cur.execute("CREATE TEMP TABLE IF NOT EXISTS find_names (name TEXT PRIMARY KEY)")
+		self.db_cur.execute("CREATE TEMP TABLE IF NOT EXISTS find_shots (guid_shot INTEGER PRIMARY KEY)")
+		self.db_cur.execute("DELETE FROM find_names")
+		self.db_cur.execute("DELETE FROM find_shots")
+		self.db_cur.executemany("INSERT OR IGNORE INTO find_names (name) VALUES (?)", ((shot,) for shot in results))
+
+		# A proxy is only kept if no other copy of the shot exists
+		sql_proxy = " OR ".join(["LOWER({col}) LIKE ?"] * len(self.__class__.PROXY_PATTERNS))
+		params_proxy = tuple(f"%{pattern}%" for pattern in self.__class__.PROXY_PATTERNS)
+		sql_filter = ""
+		if ignoreproxies:
+			sql_filter = "AND (NOT ({}) OR NOT EXISTS (SELECT 1 FROM shots others WHERE others.name = shots.name AND NOT ({})))".format(sql_proxy.format(col="shots.base_path"), sql_proxy.format(col="others.base_path"))
+		
+		self.db_cur.execute(f"INSERT INTO find_shots (guid_shot) SELECT shots.guid_shot FROM find_names INNER JOIN shots ON shots.name = find_names.name WHERE EXISTS (SELECT 1 FROM files WHERE files.guid_shot = shots.guid_shot) {sql_filter}", params_proxy * 2 if ignoreproxies else ())
+
+		# Files of every matched shot, in one go
+		files = {}
+		for guid_shot, rel_path, startblock, filesize in self.db_cur.execute("SELECT files.guid_shot, files.rel_path, files.startblock, files.size FROM find_shots INNER JOIN files ON files.guid_shot = find_shots.guid_shot ORDER BY files.guid_shot, files.startblock ASC"):
+			files.setdefault(guid_shot, []).append({"path":pathlib.Path(rel_path), "startblock":startblock, "size": filesize})
+		
+		# Shots, with one Tape per tape
+		tapes = {}
+		for guid_shot, shot_name, shot_basepath, shot_tape_name, shot_tape_density in self.db_cur.execute("SELECT shots.guid_shot, shots.name, shots.base_path, tapes.name, tapes.density FROM find_shots INNER JOIN shots ON shots.guid_shot = find_shots.guid_shot INNER JOIN tapes ON tapes.guid_tape = shots.guid_tape ORDER BY shots.size DESC, shots.guid_shot").fetchall():
+			if shot_tape_name not in tapes:
+				tapes[shot_tape_name] = Tape(shot_tape_name, density=shot_tape_density)
+			shot_found = CameraRawPull(shot_name)
+			shot_found.setPath(basepath=pathlib.Path(shot_basepath), tape=tapes.get(shot_tape_name), filelist=files.get(guid_shot, []))
+			results[shot_name].append(shot_found)
+		
+		# Sizes in the shots table are as catalogued; order by the files actually found
+		for shot in results:
+			results[shot].sort(reverse=True, key=lambda x: x.getSize())
+
+		return results
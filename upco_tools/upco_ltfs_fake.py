@@ -0,0 +1,69 @@
+# upco_ltfs_fake.py from upco_tools
+# Stand-in for the ltfs command, for trying out restores without a tape drive
+# By Michael Jordan <michael@glowingpixel.com>
+#
+# The "device" is a path which a loader links to a directory of files (the "tape").  Mounting links the mount point
+# to the tape, and an interrupt unmounts it again (and ejects it, with -o eject), same as the real thing.
+#
+# Usage: python -m upco_tools.upco_ltfs_fake MOUNT_POINT -o devname=DEVICE [-o eject] [-d]
+# Point upco_ltfs at it with UPCO_LTFS="python -m upco_tools.upco_ltfs_fake", or the ltfs setting of a drive config
+
+import sys, signal, pathlib, argparse, threading
+
+def log(message):
+	print(message, file=sys.stderr, flush=True)
+
+def main(args=None):
+
+	parser = argparse.ArgumentParser(description="Directory-backed stand-in for ltfs")
+	parser.add_argument("mount_point")
+	parser.add_argument("-o", dest="options", action="append", default=[])
+	parser.add_argument("-d", dest="debug", action="store_true")
+	parser.add_argument("-f", dest="foreground", action="store_true")
+	args = parser.parse_args(args)
+
+	options = {}
+	for option in ','.join(args.options).split(','):
+		key, _, value = option.partition('=')
+		options[key] = value
+	
+	log("LTFS14000I LTFS starting, upco_ltfs_fake")
+
+	path_device = pathlib.Path(options.get("devname",""))
+	if not options.get("devname") or not path_device.is_dir():
+		log(f"LTFS11006E Cannot open device '{options.get('devname','')}': no tape loaded")
+		return 1
+	
+	# An empty directory can be mounted over; anything else is in the way
+	path_mount = pathlib.Path(args.mount_point)
+	was_dir = path_mount.is_dir() and not path_mount.is_symlink()
+	if was_dir and any(path_mount.iterdir()):
+		log(f"LTFS14013E Cannot mount the volume: {path_mount} is not empty")
+		return 1
+	elif was_dir:
+		path_mount.rmdir()
+	elif path_mount.exists() or path_mount.is_symlink():
+		log(f"LTFS14013E Cannot mount the volume: {path_mount} already exists")
+		return 1
+	
+	path_mount.symlink_to(path_device.resolve(), target_is_directory=True)
+	log("LTFS14111I Initial setup completed successfully")
+	log(f"LTFS14113I Mounted {path_device.resolve().name} on {path_mount}")
+
+	# Stay mounted until interrupted
+	stop = threading.Event()
+	for signum in (signal.SIGINT, signal.SIGTERM):
+		signal.signal(signum, lambda *_: stop.set())
+	while not stop.wait(1):
+		pass
+
+	path_mount.unlink()
+	if was_dir:
+		path_mount.mkdir()
+	if "eject" in options and path_device.is_symlink():
+		path_device.unlink()
+	log("LTFS14112I Unmounted successfully")
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
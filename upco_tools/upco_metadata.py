@@ -3,17 +3,22 @@
 # By Michael Jordan <michael.jordan@nbcuni.com>
 
 from . import upco_timecode
-import subprocess, json, pathlib
+import subprocess, json, pathlib, os, shutil, threading, concurrent.futures, sqlite3, time, warnings, enum, struct, atexit
 
-# On import, find ffprobe
+# Environment variable which, if set, points to the ffprobe binary to use
+ENV_FFPROBE = "UPCO_FFPROBE"
+
+# Find ffprobe: explicit path, then $UPCO_FFPROBE, then $PATH, then the usual suspects
 def find_ffprobe(input_path=None):
 
 	if input_path:
 		searchpaths = [input_path]
 	else:
-		searchpaths = ["/usr/local/bin/ffprobe", r"C:\ffmpeg\bin\ffprobe.exe"]
+		searchpaths = [os.environ.get(ENV_FFPROBE), shutil.which("ffprobe"), "/usr/local/bin/ffprobe", r"C:\ffmpeg\bin\ffprobe.exe"]
 
 	for searchpath in searchpaths:
+		if not searchpath:
+			continue
 		try:
 			searchpath = pathlib.Path(searchpath)
 		except: pass
@@ -23,7 +28,529 @@ def find_ffprobe(input_path=None):
 	
 	raise Exception("Could not find ffprobe on this system.")
 
-path_ffprobe = find_ffprobe()
+# ffprobe is located on first use rather than on import, then cached here
+path_ffprobe = None
+_lock_ffprobe = threading.Lock()
+
+def get_ffprobe(input_path=None):
+	"""Return the path to ffprobe, searching for it once and caching the result.  An explicit input_path bypasses the cache."""
+
+	global path_ffprobe
+
+	if input_path:
+		return find_ffprobe(input_path)
+
+	with _lock_ffprobe:
+		if path_ffprobe is None:
+			path_ffprobe = find_ffprobe()
+	
+	return path_ffprobe
+
+# Version string of a given ffprobe, cached per binary
+_versions_ffprobe = {}
+
+def get_ffprobe_version(path_ffprobe):
+	
+	path_ffprobe = str(path_ffprobe)
+	if path_ffprobe not in _versions_ffprobe:
+		try:
+			output = subprocess.run([path_ffprobe, "-version"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True).stdout
+			_versions_ffprobe[path_ffprobe] = output.splitlines()[0].strip() if output else "unknown"
+		except Exception:
+			_versions_ffprobe[path_ffprobe] = "unknown"
+	
+	return _versions_ffprobe[path_ffprobe]
+
+# ------
+# CLASS: ProbeCache
+# Persistent sqlite3 cache of parsed ffprobe output
+# ------
+
+# Environment variable which, if set, overrides the location of the default probe cache
+ENV_PROBE_CACHE = "UPCO_PROBE_CACHE"
+
+class ProbeCache:
+	"""
+	Cache of parsed ffprobe JSON, keyed by absolute path, file size, mtime and ffprobe version.
+
+	One entry is kept per path; a changed file or ffprobe version is a miss and is replaced on the next store.
+	The least-recently-used entries are evicted past max_entries.
+	"""
+
+	DEFAULT_PATH = pathlib.Path.home()/".upco_tools"/"probe_cache.db"
+	SCHEMA_VERSION = 2
+
+	# Access times are written back once this many have built up, or once the oldest is this many seconds old
+	FLUSH_TOUCHED_ENTRIES = 256
+	FLUSH_TOUCHED_SECONDS = 30
+
+	def __init__(self, path_db=None, max_entries=250000):
+
+		self.path_db = pathlib.Path(path_db or os.environ.get(ENV_PROBE_CACHE) or self.__class__.DEFAULT_PATH)
+		self.max_entries = int(max_entries)
+
+		self.hits   = 0
+		self.misses = 0
+
+		self._lock = threading.Lock()
+		self._touched = {}		# (path, profile) -> last access, flushed in batches so reads don't each cost a write
+		self._touched_since = time.monotonic()
+		
+		try:
+			self.path_db.parent.mkdir(parents=True, exist_ok=True)
+			self.db_con = sqlite3.connect(str(self.path_db), check_same_thread=False)
+		except Exception as e:
+			raise Exception(f"Error loading probe cache at {self.path_db}: {e}")
+
+		self.db_setup()
+		self._count = self.db_con.execute("SELECT COUNT(*) FROM probes").fetchone()[0]
+
+	def db_setup(self):
+
+		with self._lock:
+			self.db_con.execute("PRAGMA journal_mode=WAL")
+			self.db_con.execute("PRAGMA synchronous=NORMAL")
+
+			# Start over if the cache was written by a different version of this class
+			if self.db_con.execute("PRAGMA user_version").fetchone()[0] != self.__class__.SCHEMA_VERSION:
+				self.db_con.execute("DROP TABLE IF EXISTS probes")
+				self.db_con.execute(f"PRAGMA user_version={self.__class__.SCHEMA_VERSION}")
+			
+			self.db_con.execute("""CREATE TABLE IF NOT EXISTS probes (
+				path TEXT NOT NULL,
+				profile TEXT NOT NULL,
+				size INTEGER NOT NULL,
+				mtime INTEGER NOT NULL,
+				version TEXT NOT NULL,
+				ffprobe TEXT NOT NULL,
+				last_access INTEGER NOT NULL,
+				PRIMARY KEY (path, profile)
+			);""")
+			self.db_con.execute("CREATE INDEX IF NOT EXISTS idx_probes_access on probes(last_access);")
+			self.db_con.commit()
+	
+	@staticmethod
+	def _getKey(path_input, path_ffprobe):
+		path_input = pathlib.Path(path_input).resolve()
+		stat = path_input.stat()
+		return str(path_input), stat.st_size, stat.st_mtime_ns, get_ffprobe_version(path_ffprobe)
+
+	def get(self, path_input, path_ffprobe, profile="full"):
+		"""Return cached ffprobe output as a dict, or None if it isn't cached or the file has changed"""
+
+		path, size, mtime, version = self._getKey(path_input, path_ffprobe)
+
+		with self._lock:
+			row = self.db_con.execute("SELECT size, mtime, version, ffprobe FROM probes WHERE path=? AND profile=?", (path, profile)).fetchone()
+
+			if row is None or tuple(row[:3]) != (size, mtime, version):
+				self.misses += 1
+				return None
+			
+			self.hits += 1
+			if not self._touched:
+				self._touched_since = time.monotonic()
+			self._touched[(path, profile)] = int(time.time())
+			if len(self._touched) >= self.__class__.FLUSH_TOUCHED_ENTRIES or time.monotonic() - self._touched_since >= self.__class__.FLUSH_TOUCHED_SECONDS:
+				self._flushTouched()
+		
+		return json.loads(row[3])
+
+	def set(self, path_input, path_ffprobe, ffprobe_parsed, profile="full"):
+		"""Store parsed ffprobe output for a file"""
+
+		path, size, mtime, version = self._getKey(path_input, path_ffprobe)
+
+		with self._lock:
+			replaced = self.db_con.execute("SELECT 1 FROM probes WHERE path=? AND profile=?", (path, profile)).fetchone()
+			self.db_con.execute("INSERT OR REPLACE INTO probes (path, profile, size, mtime, version, ffprobe, last_access) VALUES (?,?,?,?,?,?,?)", (path, profile, size, mtime, version, json.dumps(ffprobe_parsed), int(time.time())))
+			self.db_con.commit()
+			
+			if not replaced:
+				self._count += 1
+			if self._count > self.max_entries:
+				self._evict()
+
+	def _evict(self):
+		"""Drop least-recently-used entries down to 90% of max_entries.  Call with the lock held."""
+
+		self._flushTouched()
+		excess = self._count - int(self.max_entries * 0.9)
+		self.db_con.execute("DELETE FROM probes WHERE rowid IN (SELECT rowid FROM probes ORDER BY last_access ASC LIMIT ?)", (excess,))
+		self.db_con.commit()
+		self._count = self.db_con.execute("SELECT COUNT(*) FROM probes").fetchone()[0]
+
+	def _flushTouched(self):
+		if self._touched:
+			self.db_con.executemany("UPDATE probes SET last_access=? WHERE path=? AND profile=?", ((accessed, path, profile) for (path, profile), accessed in self._touched.items()))
+			self.db_con.commit()
+			self._touched = {}
+
+	def getStats(self):
+		lookups = self.hits + self.misses
+		return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0, "entries": self._count}
+
+	def clear(self):
+		with self._lock:
+			self.db_con.execute("DELETE FROM probes")
+			self.db_con.commit()
+			self._touched = {}
+			self._count = 0
+
+	def close(self):
+		with self._lock:
+			self._flushTouched()
+			self.db_con.close()
+
+# Default cache shared by all Metadata objects, opened on first use
+_probe_cache = None
+_lock_probe_cache = threading.Lock()
+
+def get_probe_cache():
+	"""Return the default ProbeCache, or None if it can't be opened"""
+
+	global _probe_cache
+	
+	with _lock_probe_cache:
+		if _probe_cache is None:
+			try:
+				_probe_cache = ProbeCache()
+				atexit.register(_probe_cache.close)
+			except Exception as e:
+				warnings.warn(f"Probe cache is unavailable: {e}")
+				_probe_cache = False
+	
+	return _probe_cache or None
+
+# ------
+# Native header readers
+# Pull start timecode, reel name, framerate and frame count straight from QuickTime and MXF headers,
+# without launching ffprobe.  These return None whenever they aren't sure, so the caller can fall back.
+# ------
+
+# Largest moov atom or MXF header we're willing to read into memory
+NATIVE_HEADER_LIMIT = 64 * 1024 * 1024
+
+def _iterAtoms(data, start, end):
+	"""Yield (type, data start, data end) for each QuickTime atom in data[start:end]"""
+
+	pos = start
+	while pos + 8 <= end:
+		size, kind = struct.unpack_from(">I4s", data, pos)
+		header_size = 8
+		if size == 1:
+			if pos + 16 > end: return
+			size = struct.unpack_from(">Q", data, pos + 8)[0]
+			header_size = 16
+		elif size == 0:
+			size = end - pos
+		if size < header_size or pos + size > end:
+			return
+		yield kind, pos + header_size, pos + size
+		pos += size
+
+def _findAtom(data, start, end, *path):
+	"""Follow a path of nested atom types, returning (data start, data end) of the first match or None"""
+
+	for kind_wanted in path:
+		for kind, child_start, child_end in _iterAtoms(data, start, end):
+			if kind == kind_wanted:
+				start, end = child_start, child_end
+				break
+		else:
+			return None
+	return start, end
+
+def _readQuickTimeHeader(file_input):
+
+	# Find the moov atom at the top level, seeking past mdat and friends
+	file_input.seek(0, os.SEEK_END)
+	file_size = file_input.tell()
+	pos = 0
+	moov = None
+
+	while pos + 8 <= file_size:
+		file_input.seek(pos)
+		size, kind = struct.unpack(">I4s", file_input.read(8))
+		header_size = 8
+		if size == 1:
+			size = struct.unpack(">Q", file_input.read(8))[0]
+			header_size = 16
+		elif size == 0:
+			size = file_size - pos
+		if size < header_size:
+			return None
+		if kind == b"moov":
+			if size > NATIVE_HEADER_LIMIT:
+				return None
+			moov = file_input.read(size - header_size)
+			break
+		pos += size
+	
+	if not moov:
+		return None
+
+	video = {}
+	tmcd = None
+
+	for kind, trak_start, trak_end in _iterAtoms(moov, 0, len(moov)):
+		if kind != b"trak":
+			continue
+
+		mdia = _findAtom(moov, trak_start, trak_end, b"mdia")
+		hdlr = mdia and _findAtom(moov, *mdia, b"hdlr")
+		mdhd = mdia and _findAtom(moov, *mdia, b"mdhd")
+		stbl = mdia and _findAtom(moov, *mdia, b"minf", b"stbl")
+		stsd = stbl and _findAtom(moov, *stbl, b"stsd")
+		if not (hdlr and mdhd and stsd):
+			continue
+
+		handler = moov[hdlr[0]+8:hdlr[0]+12]
+		entry = stsd[0] + 8		# Skip version/flags and entry count to the first sample description
+
+		# First video track: dimensions, framerate and frame count
+		if handler == b"vide" and not video:
+			stts = _findAtom(moov, *stbl, b"stts")
+			if not stts:
+				return None
+			
+			if moov[mdhd[0]] == 1:
+				timescale = struct.unpack_from(">I", moov, mdhd[0]+20)[0]
+			else:
+				timescale = struct.unpack_from(">I", moov, mdhd[0]+12)[0]
+
+			entries = struct.unpack_from(">I", moov, stts[0]+4)[0]
+			samples = [struct.unpack_from(">II", moov, stts[0]+8+idx*8) for idx in range(entries)]
+			framecount = sum(count for count, _ in samples)
+			duration = sum(count * delta for count, delta in samples)
+			if not (timescale and framecount and duration):
+				return None
+
+			width, height = struct.unpack_from(">HH", moov, entry+32)
+			video.update({"width": width, "height": height, "framerate": timescale * framecount / duration, "framecount": framecount})
+		
+		# First timecode track: start frame and reel name
+		elif handler == b"tmcd" and tmcd is None:
+			entry_size = struct.unpack_from(">I", moov, entry)[0]
+			flags, tc_timescale, tc_frameduration, tc_nframes = struct.unpack_from(">IIIB", moov, entry+20)
+
+			# Drop-frame and counter timecodes aren't supported here
+			if flags & 0x0001 or flags & 0x0008 or not tc_nframes:
+				return None
+
+			tmcd = {"nframes": tc_nframes}
+
+			name = _findAtom(moov, entry+34, entry+entry_size, b"name")
+			if name:
+				strlen = struct.unpack_from(">H", moov, name[0])[0]
+				tmcd["tape"] = moov[name[0]+4:name[0]+4+strlen].decode("utf-8", errors="replace")
+			
+			# The timecode sample itself lives in the first chunk
+			stco = _findAtom(moov, *stbl, b"stco")
+			co64 = _findAtom(moov, *stbl, b"co64")
+			if stco and struct.unpack_from(">I", moov, stco[0]+4)[0]:
+				tmcd["offset"] = struct.unpack_from(">I", moov, stco[0]+8)[0]
+			elif co64 and struct.unpack_from(">I", moov, co64[0]+4)[0]:
+				tmcd["offset"] = struct.unpack_from(">Q", moov, co64[0]+8)[0]
+			else:
+				return None
+
+	if not video:
+		return None
+
+	if tmcd is not None:
+		file_input.seek(tmcd.get("offset"))
+		sample = file_input.read(4)
+		if len(sample) != 4:
+			return None
+		video["tc_start"] = upco_timecode.Timecode(struct.unpack(">I", sample)[0], tmcd.get("nframes")).getTimecode()
+		if tmcd.get("tape"):
+			video["tape"] = tmcd.get("tape")
+
+	return video
+
+# MXF keys and local tags used below
+MXF_KEY_PREFIX         = b"\x06\x0e\x2b\x34"
+MXF_PARTITION_HEADER   = b"\x06\x0e\x2b\x34\x02\x05\x01\x01\x0d\x01\x02\x01\x01\x02"
+MXF_SET_PREFIX         = b"\x0d\x01\x01\x01\x01\x01"	# Bytes 8-13 of a structural metadata set key
+MXF_PACK_PREFIX        = b"\x0d\x01\x02\x01\x01"		# Bytes 8-12 of partition, primer and index keys
+MXF_ESSENCE_PREFIX     = b"\x0d\x01\x03"				# Bytes 8-10 of an essence element key
+MXF_SET_MATERIAL_PACKAGE, MXF_SET_SOURCE_PACKAGE, MXF_SET_TRACK, MXF_SET_SEQUENCE, MXF_SET_SOURCE_CLIP, MXF_SET_TIMECODE = (0x36, 0x37, 0x3b, 0x0f, 0x11, 0x14)
+MXF_DATADEF_PICTURE    = b"\x01\x03\x02\x02\x01"	# Bytes 8-12 of the picture data definition
+
+def _readBer(data, pos):
+	"""Decode a BER length at pos, returning (length, position after it)"""
+
+	length = data[pos]
+	if length < 0x80:
+		return length, pos + 1
+	count = length & 0x7f
+	return int.from_bytes(data[pos+1:pos+1+count], "big"), pos + 1 + count
+
+def _readMxfHeader(file_input):
+
+	data = file_input.read(65536)
+	if not data.startswith(MXF_PARTITION_HEADER) or len(data) < 64:
+		return None
+
+	# Header partition must be complete, or durations may not have been filled in yet
+	if data[14] not in (0x03, 0x04):
+		return None
+
+	length, pos = _readBer(data, 16)
+	header_bytecount = struct.unpack_from(">Q", data, pos + 32)[0]
+	pos += length
+
+	# Read enough to cover the header metadata, allowing for fill before it
+	budget = pos + header_bytecount + 65536
+	if budget > NATIVE_HEADER_LIMIT:
+		return None
+	if budget > len(data):
+		data += file_input.read(budget - len(data))
+
+	# Gather every structural metadata set by its instance UID
+	sets = {}
+	while pos + 17 <= len(data):
+		key = data[pos:pos+16]
+		if not key.startswith(MXF_KEY_PREFIX):
+			return None
+		length, value_start = _readBer(data, pos + 16)
+		value_end = value_start + length
+		if value_end > len(data):
+			break
+
+		# Stop at essence, index tables or the next partition
+		if key[8:11] == MXF_ESSENCE_PREFIX or (key[8:13] == MXF_PACK_PREFIX and key[13] in (0x02, 0x03, 0x04, 0x10, 0x11)):
+			break
+		
+		if key[5] == 0x53 and key[8:14] == MXF_SET_PREFIX:
+			tags = {}
+			tag_pos = value_start
+			while tag_pos + 4 <= value_end:
+				tag, tag_length = struct.unpack_from(">HH", data, tag_pos)
+				tags[tag] = data[tag_pos+4:tag_pos+4+tag_length]
+				tag_pos += 4 + tag_length
+			tags["type"] = key[14]
+			if 0x3c0a in tags:
+				sets[tags[0x3c0a]] = tags
+		
+		pos = value_end
+	
+	def refs(tags, tag):
+		"""Resolve a batch of strong references"""
+		value = tags.get(tag, b"")
+		if len(value) < 8:
+			return []
+		count, size = struct.unpack_from(">II", value, 0)
+		return [sets.get(value[8+idx*size:8+(idx+1)*size]) for idx in range(count) if sets.get(value[8+idx*size:8+(idx+1)*size])]
+
+	def components(track):
+		"""The components under a track's sequence, or the lone component if there's no sequence"""
+		sequence = sets.get(track.get(0x4803))
+		if sequence is None:
+			return None, []
+		if sequence.get("type") == MXF_SET_SEQUENCE:
+			return sequence, refs(sequence, 0x1001)
+		return sequence, [sequence]
+
+	def pictureTrack(package):
+		for track in refs(package, 0x4403):
+			sequence, _ = components(track)
+			if sequence is not None and sequence.get(0x0201, b"")[8:13] == MXF_DATADEF_PICTURE:
+				return track
+		return None
+
+	def sourceClip(track):
+		_, clips = components(track)
+		return next((clip for clip in clips if clip.get("type") == MXF_SET_SOURCE_CLIP), None)
+
+	packages = {tags.get(0x4401): tags for tags in sets.values() if tags.get("type") in (MXF_SET_MATERIAL_PACKAGE, MXF_SET_SOURCE_PACKAGE)}
+	material = next((tags for tags in sets.values() if tags.get("type") == MXF_SET_MATERIAL_PACKAGE), None)
+	if material is None:
+		return None
+
+	# Framerate and duration from the material package's picture track
+	track = pictureTrack(material)
+	if track is None or len(track.get(0x4b01, b"")) != 8:
+		return None
+	
+	rate_num, rate_den = struct.unpack(">ii", track.get(0x4b01))
+	sequence, _ = components(track)
+	framecount = struct.unpack(">q", sequence.get(0x0202))[0] if len(sequence.get(0x0202, b"")) == 8 else -1
+	if rate_num <= 0 or rate_den <= 0 or framecount < 0:
+		return None
+	
+	video = {"framerate": rate_num / rate_den, "framecount": framecount}
+
+	# Dimensions from the file package's picture descriptor
+	clip = sourceClip(track)
+	package_file = packages.get(clip.get(0x1101)) if clip else None
+	descriptors = [sets.get(package_file.get(0x4701))] if package_file else []
+	descriptors += refs(descriptors[0], 0x3f01) if descriptors and descriptors[0] else []
+	descriptor = next((tags for tags in descriptors if tags and 0x3203 in tags and 0x3202 in tags), None)
+	if descriptor is None:
+		return None
+	
+	width  = struct.unpack(">I", descriptor.get(0x3203))[0]
+	height = struct.unpack(">I", descriptor.get(0x3202))[0]
+	layout = descriptor.get(0x320c, b"\x00")[0]
+	if layout in (0x01, 0x04):	# Separate fields or segmented frame: stored height is per field
+		height *= 2
+	elif layout not in (0x00, 0x03):
+		return None
+	video.update({"width": width, "height": height})
+
+	# Start timecode from the material package's timecode component
+	for track_tc in refs(material, 0x4403):
+		_, clips = components(track_tc)
+		tc = next((clip for clip in clips if clip.get("type") == MXF_SET_TIMECODE), None)
+		if tc is None:
+			continue
+
+		# Drop-frame isn't supported here
+		if tc.get(0x1503, b"\x00") != b"\x00":
+			return None
+		tc_base = struct.unpack(">H", tc.get(0x1502))[0]
+		video["tc_start"] = upco_timecode.Timecode(struct.unpack(">q", tc.get(0x1501))[0], tc_base).getTimecode()
+		break
+
+	# Reel name from the physical source package behind the file package, if there is one
+	track_file = pictureTrack(package_file)
+	clip = sourceClip(track_file) if track_file else None
+	package_physical = packages.get(clip.get(0x1101)) if clip else None
+	if package_physical and package_physical.get(0x4402):
+		video["tape"] = package_physical.get(0x4402).decode("utf-16-be", errors="replace").rstrip("\x00")
+
+	return video
+
+def read_native_header(path_input):
+	"""
+	Read start timecode, reel name, framerate, frame count and dimensions directly from a QuickTime or MXF header.
+
+	Only the header bytes are read: the moov atom and the timecode sample in QuickTime, or the header
+	metadata in MXF.  Returns None if the format isn't supported or anything looks unusual, in which case
+	ffprobe should be used instead.
+
+	Arguments:
+		path_input {str|pathlib.Path} -- Path of the media file
+
+	Returns:
+		dict|None -- Fields as found in Metadata.video, or None if unsure
+	"""
+
+	path_input = pathlib.Path(path_input)
+	suffix = path_input.suffix.lower()
+	
+	try:
+		with path_input.open("rb") as file_input:
+			if suffix in (".mov", ".mp4", ".m4v"):
+				return _readQuickTimeHeader(file_input)
+			elif suffix == ".mxf":
+				return _readMxfHeader(file_input)
+	except (OSError, struct.error, IndexError, TypeError, ValueError, AttributeError):
+		return None
+
+	return None
 
 # ------
 # CLASS: Metadata
@@ -31,10 +558,20 @@ path_ffprobe = find_ffprobe()
 # ------
 
 class Metadata:
+
+	class Profile(enum.Enum):
+		"""How much ffprobe is asked to report: everything, or only the entries Metadata uses"""
+		FULL, LEAN = ("full", "lean")
+
+	# ffprobe arguments for each profile
+	FFPROBE_ARGS = {
+		Profile.FULL: ["-show_format", "-show_streams"],
+		Profile.LEAN: ["-show_entries", "stream=codec_type,width,height,r_frame_rate,nb_frames,bits_per_raw_sample,duration:stream_tags=reel_name,timecode:format=duration"]
+	}
 	
-	def __init__(self, path_input):
+	def __init__(self, path_input, path_ffprobe=None, cache=True, profile=Profile.FULL, native=False):
 
-		self.path_ffprobe = path_ffprobe
+		self.path_ffprobe = None
 		self.path = None
 		
 		self.hasvideo	 = False
@@ -57,20 +594,54 @@ class Metadata:
 			raise Exception("File does not exist or is inaccessible")
 
 		self.path = path_input
+		self.profile = self.__class__.Profile(profile)
+
+		# Read QuickTime or MXF headers directly if asked, and only run ffprobe if that doesn't pan out
+		header = read_native_header(path_input) if native else None
+
+		if header is not None:
+			self.hasvideo = True
+			self.video.update(header)
+		else:
+			self._probe(path_ffprobe, cache)
 		
-		# Run ffprobe and retrieve output as JSON
-		try:
-			ffprobe_json = subprocess.Popen([str(self.path_ffprobe), "-v","quiet", "-print_format","json", "-show_format", "-show_streams", str(path_input)], stdout=subprocess.PIPE)
-		except Exception as e:
-			raise Exception(f"Error launching ffprobe: {e}")
+		# Figure out what's here
+		self.hastapename = ("tape" in self.video.keys() and len(self.video.get("tape").strip()))
+		self.hastimecode = all(x in self.video.keys() for x in ["tc_start","framecount","framerate"])
+		
+		# Process end timecode from parsed metadata
+		if not self.hastimecode and "framecount" in self.video.keys() and "framerate" in self.video.keys():
+			self.video.update({"tc_start":"00:00:00:00"})
 		
-		# Parse JSON into dict
 		try:
-			ffprobe_parsed = json.loads(ffprobe_json.communicate()[0])
+			tc_start = upco_timecode.Timecode(self.video.get("tc_start"), self.video.get("framerate", 23.976))
+			tc_end = tc_start + upco_timecode.Timecode(self.video.get("framecount",0), self.video.get("framerate",23.976))
+			self.video.update({"tc_start":tc_start, "tc_end":tc_end})
 		except Exception as e:
-			raise Exception(f"Error parsing metadata: {e}")
+			# Deal with invalid timecodes here
+			raise Exception(f"Error parsing timecode: {e}")
+
+	def _probe(self, path_ffprobe=None, cache=True):
+		"""Get ffprobe output, from the cache if possible, and parse it"""
+
+		self.path_ffprobe = get_ffprobe(path_ffprobe)
+
+		# Use the default cache, a given ProbeCache, or none at all
+		if cache is True:
+			cache = get_probe_cache()
+		
+		ffprobe_parsed = cache.get(self.path, self.path_ffprobe, self.profile.value) if cache else None
+
+		if ffprobe_parsed is None:
+			ffprobe_parsed = self._runFfprobe()
+			if cache:
+				cache.set(self.path, self.path_ffprobe, ffprobe_parsed, self.profile.value)
 		
 		self.ffprobe = ffprobe_parsed
+		self._parseFfprobe(ffprobe_parsed)
+
+	def _parseFfprobe(self, ffprobe_parsed):
+		"""Pull video properties and tape/timecode tags from ffprobe output"""
 		
 		# Pull info from streams
 		if not len(ffprobe_parsed.get("streams",'')):
@@ -91,8 +662,16 @@ class Metadata:
 					fps_split = stream.get("r_frame_rate").split('/')
 					self.video.update({"framerate":float(fps_split[0])/int(fps_split[1])})
 				
-				if "nb_frames" in stream.keys():
+				if str(stream.get("nb_frames",'')).isdigit():
 					self.video.update({"framecount": int(stream.get("nb_frames",''))})
+				
+				# Without nb_frames, work it out from the stream or container duration rather than having ffprobe count packets
+				elif "framerate" in self.video.keys():
+					duration = stream.get("duration") or ffprobe_parsed.get("format",{}).get("duration")
+					try:
+						self.video.update({"framecount": int(round(float(duration) * self.video.get("framerate")))})
+					except (TypeError, ValueError):
+						pass
 					
 				if "bits_per_raw_sample" in stream.keys():
 					self.video.update({"bitdepth": float(stream.get("bits_per_raw_sample",''))})
@@ -107,19 +686,51 @@ class Metadata:
 					
 					self.hastimecode = True
 					self.video.update({"tc_start":str(stream.get("tags").get("timecode"))})
+
+	def _runFfprobe(self):
+		"""Run ffprobe and return its output parsed as a dict"""
+
+		# Run ffprobe and retrieve output as JSON
+		try:
+			ffprobe_json = subprocess.Popen([str(self.path_ffprobe), "-v","quiet", "-print_format","json", *self.__class__.FFPROBE_ARGS[self.profile], str(self.path)], stdout=subprocess.PIPE)
+		except Exception as e:
+			raise Exception(f"Error launching ffprobe: {e}")
 		
-		# Figure out what's here
-		self.hastapename = ("tape" in self.video.keys() and len(self.video.get("tape").strip()))
-		self.hastimecode = all(x in self.video.keys() for x in ["tc_start","framecount","framerate"])
-		
-		# Process end timecode from parsed metadata
-		if not self.hastimecode and "framecount" in self.video.keys() and "framerate" in self.video.keys():
-			self.video.update({"tc_start":"00:00:00:00"})
-		
+		# Parse JSON into dict
 		try:
-			tc_start = upco_timecode.Timecode(self.video.get("tc_start"), self.video.get("framerate", 23.976))
-			tc_end = tc_start + upco_timecode.Timecode(self.video.get("framecount",0), self.video.get("framerate",23.976))
-			self.video.update({"tc_start":tc_start, "tc_end":tc_end})
+			return json.loads(ffprobe_json.communicate()[0])
 		except Exception as e:
-			# Deal with invalid timecodes here
-			raise Exception(f"Error parsing timecode: {e}")
+			raise Exception(f"Error parsing metadata: {e}")
+
+# Probe many files at once
+def probe_many(paths, max_workers=8, path_ffprobe=None, errors=None, cache=True, profile=Metadata.Profile.FULL, native=False):
+	"""
+	Probe files concurrently, running up to max_workers ffprobe processes at a time.
+
+	Arguments:
+		paths {iter} -- Paths of media files to probe
+
+	Keyword Arguments:
+		max_workers {int} -- Maximum number of concurrent ffprobe processes (default: {8})
+		path_ffprobe {str|pathlib.Path} -- Path to ffprobe, if not the default (default: {None})
+		errors {dict} -- If given, files which could not be probed are recorded here as {path: exception} (default: {None})
+		cache {bool|ProbeCache} -- Probe cache to consult, as with Metadata (default: {True})
+		profile {Metadata.Profile} -- ffprobe profile, as with Metadata (default: {Metadata.Profile.FULL})
+		native {bool} -- Try reading QuickTime/MXF headers directly first, as with Metadata (default: {False})
+
+	Yields:
+		Metadata -- Results in the order they complete.  Files which fail are skipped rather than raising.
+	"""
+
+	# Find ffprobe up front so a missing binary fails once, not once per file
+	if not native:
+		path_ffprobe = get_ffprobe(path_ffprobe)
+
+	with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+		futures = {pool.submit(Metadata, path, path_ffprobe, cache, profile, native): path for path in paths}
+		for future in concurrent.futures.as_completed(futures):
+			try:
+				yield future.result()
+			except Exception as e:
+				if errors is not None:
+					errors[futures[future]] = e
@@ -254,7 +254,6 @@ class Shotlist:
 		"""
 		used_columns = ["Name",sourcecol,"Start","Duration","End"]
 		meta_columns = []
-		pat_invalid  = re.compile("[\t\r\n]+")
 		heading = heading or {"FIELD_DELIM":"TABS","VIDEO_FORMAT":1080}
 
 		# Double-check that we're not mixing timecode framerates
@@ -288,39 +287,11 @@ class Shotlist:
 		elif omitColumns:
 			raise ValueError("omitColumns must be a list")
 
-		# Build heading
-		print("Heading", file=stream_output)
-		{print(f"{key}\t{heading.get(key,'')}", file=stream_output) for key in heading.keys()}
-		print("", file=stream_output)
-
-		print("Column", file=stream_output)
-		print('\t'.join(used_columns), file=stream_output)
-		print("", file=stream_output)
-
-		print("Data", file=stream_output)
-		
-		# TODO: Clean tabs or newlines from data
+		# Write heading, columns and each shot
+		writer = AleWriter(stream_output, used_columns, heading=heading, sourcecol=sourcecol)
 		for shot in self._shots:
-		
-			# TODO: Deep copy metadata dict? Or handle in shot.getMetadata()?
-			metadata = shot.metadata
-			metadata.update({sourcecol:shot.shot, "Start":shot.tc_start, "End":shot.tc_end, "Duration":shot.tc_duration})
-			
-			# Deal with special columns
-			if "Name" in used_columns:									# Name is currently a default column but could be specified as an omitted_column
-				metadata["Name"] = metadata.get("Name", shot.shot)		# Name gets tape name if none is specified
-			
-			if "Tracks" in used_columns:
-				#print("Adding tracks to ", shot.shot)
-				metadata["Tracks"] = metadata.get("Tracks","VA1A2")	# Tracks get default V1/A1A2 if none is specified
-
-			# Convert keys to lower case for case-insensitive column header matching
-			metadata = {x.lower(): metadata.get(x) for x in metadata.keys()}
-			
-			# Write to file
-			print('\t'.join(pat_invalid.sub("  ", str(metadata.get(col.lower(),""))) for col in used_columns), file=stream_output)
-		
-		print("", file=stream_output)
+			writer.writeShot(shot)
+		writer.close()
 
 		return stream_output
 
@@ -378,6 +349,97 @@ class Shotlist:
 	def __repr__(self):
 		return f"{self.__class__.__name__}({len(self)} shot{'' if len(self) == 1 else 's'}, {self.framerates} fps)"
 
+class AleWriter:
+	"""
+	Write an ALE one shot at a time, for when shots are still arriving as the ALE is written.
+
+	Columns are fixed up front.  The heading is written along with the first shot, taking its FPS from that
+	shot unless one was given, and shots with incompatible timecode framerates are refused.
+	"""
+
+	pat_invalid = re.compile("[\t\r\n]+")
+
+	def __init__(self, stream_output, columns=None, heading=None, sourcecol="Tape"):
+		"""
+		Arguments:
+			stream_output {iostream} -- Output stream (can be file or something like StringIO)
+
+		Keyword Arguments:
+			columns {list} -- Column names to write (default: {Name, sourcecol, Start, Duration, End})
+			heading {dict} -- ALE heading (default: {FIELD_DELIM: TABS, VIDEO_FORMAT: 1080})
+			sourcecol {str} -- Column holding the shot name (default: {"Tape"})
+		"""
+
+		self.stream_output = stream_output
+		self.columns   = list(columns or ["Name",sourcecol,"Start","Duration","End"])
+		self.heading   = dict(heading or {"FIELD_DELIM":"TABS","VIDEO_FORMAT":1080})
+		self.sourcecol = sourcecol
+		self.shotcount = 0
+		self._started  = False
+		self._closed   = False
+
+	def _writeHeading(self):
+
+		print("Heading", file=self.stream_output)
+		for key in self.heading.keys():
+			print(f"{key}\t{self.heading.get(key,'')}", file=self.stream_output)
+		print("", file=self.stream_output)
+
+		print("Column", file=self.stream_output)
+		print('\t'.join(self.columns), file=self.stream_output)
+		print("", file=self.stream_output)
+
+		print("Data", file=self.stream_output)
+		self._started = True
+
+	def writeShot(self, shot):
+		"""
+		Write a single shot to the ALE.
+
+		Raises:
+			ValueError: Shot is not a Shot, or its timecode framerate doesn't match the ALE's FPS
+		"""
+
+		if not isinstance(shot, Shot):
+			raise ValueError(f"Shot must be of type upco_shot.Shot (got {type(shot)})")
+		
+		if self._closed:
+			raise ValueError("Cannot write shots to an ALE that has been closed")
+
+		if not self._started:
+			self.heading["FPS"] = self.heading.get("FPS", round(shot.framerate,2))
+			self._writeHeading()
+		
+		if round(float(self.heading.get("FPS"))) != shot.tc_start.framerate_tc:
+			raise ValueError(f"Cannot write a {shot.framerate} fps shot to a {self.heading.get('FPS')} fps ALE")
+
+		metadata = dict(shot.metadata)
+		metadata.update({self.sourcecol:shot.shot, "Start":shot.tc_start, "End":shot.tc_end, "Duration":shot.tc_duration})
+		
+		# Deal with special columns
+		if "Name" in self.columns:									# Name is currently a default column but could be specified as an omitted_column
+			metadata["Name"] = metadata.get("Name", shot.shot)		# Name gets tape name if none is specified
+		
+		if "Tracks" in self.columns:
+			metadata["Tracks"] = metadata.get("Tracks","VA1A2")	# Tracks get default V1/A1A2 if none is specified
+
+		# Convert keys to lower case for case-insensitive column header matching
+		metadata = {x.lower(): metadata.get(x) for x in metadata.keys()}
+		
+		# Write to file
+		print('\t'.join(self.pat_invalid.sub("  ", str(metadata.get(col.lower(),""))) for col in self.columns), file=self.stream_output)
+		self.shotcount += 1
+
+	def close(self):
+		"""Finish the ALE.  Does not close the underlying stream."""
+
+		if self._closed:
+			return
+		if not self._started:
+			self._writeHeading()
+		print("", file=self.stream_output)
+		self._closed = True
+
 class Shot:
 	"""Defines a shot"""
 